@@ -5,14 +5,242 @@ JARVIS LLM 大脑模块
 Author: gngdingghuan
 """
 
-import json
-from typing import List, Dict, Any, Optional, AsyncGenerator
+import time
+import uuid
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import importlib.util
+from pathlib import Path
+from typing import List, Dict, Any, Optional, AsyncGenerator, Awaitable, Callable, Final, Tuple
+import orjson
+import openai
 from openai import AsyncOpenAI
+from cachetools import TTLCache
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 import httpx
 
 from config import get_config, LLMProvider
+from cognitive.semantic_cache import SemanticCache
 from utils.logger import log
 
+# HTTP/2 需要安装 h2（httpx[http2]）
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# JARVIS 系统提示词（作为提示词前缀，必须保持字节级不变才能命中提供商的前缀缓存）
+JARVIS_SYSTEM_PROMPT: Final[str] = """你是 JARVIS，一个智能 AI 助手，由用户创建来帮助管理日常任务和操作电脑。
+
+你的核心特征：
+1. 专业、高效、简洁的回答风格
+2. 像钢铁侠里的JARVIS一样，礼貌但不啰嗦
+3. 能够理解和执行用户的各种指令
+4. 对于危险操作会主动提醒并请求确认
+
+你可以使用的能力：
+- 系统控制：打开应用、调节音量、执行命令
+- 文件管理：读取、创建、移动、删除文件
+- 网页浏览：搜索信息、打开网页
+- 智能家居：控制 IoT 设备（如已配置）
+
+当用户发出指令时，你需要分析意图并调用相应的工具来完成任务。
+如果不确定用户的意图，请主动询问确认。
+对于危险操作（如删除文件、执行系统命令），请务必在执行前确认。"""
+
+# 系统提示词的 UTF-8 编码，供哈希计算直接使用
+JARVIS_SYSTEM_PROMPT_BYTES: Final[bytes] = JARVIS_SYSTEM_PROMPT.encode("utf-8")
+
+# 所有 LLM 客户端共享的 HTTP 连接池
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """获取共享的 httpx.AsyncClient（调大连接池，保持长连接）"""
+    global _shared_http_client
+    
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=512, max_keepalive_connections=256),
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+    
+    return _shared_http_client
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """只重试限流、连接错误和服务端错误；400/401/422 等请求本身的错误直接抛出"""
+    if isinstance(exc, (
+        openai.BadRequestError,
+        openai.AuthenticationError,
+        openai.UnprocessableEntityError,
+    )):
+        return False
+    
+    return isinstance(exc, (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        httpx.TransportError,
+    ))
+
+
+def _log_retry(retry_state):
+    """重试前记录日志"""
+    log.warning(
+        f"LLM 请求失败，{retry_state.next_action.sleep:.1f} 秒后第 {retry_state.attempt_number} 次重试: "
+        f"{retry_state.outcome.exception()}"
+    )
+
+
+# 指数退避重试：最多 4 次尝试，间隔 0.5s 起、上限 8s，带随机抖动
+_api_retry = retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=wait_exponential_jitter(multiplier=0.5, max=8.0),
+    stop=stop_after_attempt(4),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+
+
+class ResponseCache:
+    """
+    LLM 响应缓存
+    以请求内容的 SHA256 为键，内存 TTLCache + 可选 SQLite 持久化
+    SQLite 读写在线程池中执行，不阻塞事件循环
+    """
+    
+    def __init__(self, maxsize: int = 1000, ttl: int = 3600, db_path: Optional[str] = None):
+        """
+        初始化响应缓存
+        
+        Args:
+            maxsize: 内存缓存最大条目数
+            ttl: 缓存有效期（秒）
+            db_path: SQLite 持久化路径，None 表示只使用内存
+        """
+        self._memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._ttl = ttl
+        self._db: Optional[sqlite3.Connection] = None
+        # 同一连接可能被多个工作线程使用，读写串行化
+        self._db_lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        
+        if db_path:
+            self._init_db(db_path)
+    
+    def _init_db(self, db_path: str):
+        """初始化 SQLite 持久化存储"""
+        try:
+            path = Path(db_path).expanduser()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            
+        except sqlite3.Error as e:
+            log.warning(f"LLM 缓存数据库初始化失败，仅使用内存缓存: {e}")
+            self._db = None
+    
+    @staticmethod
+    def make_key(**request) -> str:
+        """根据请求内容生成缓存键"""
+        payload = orjson.dumps(request, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return hashlib.sha256(payload).hexdigest()
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，未命中返回 None"""
+        result = self._memory.get(key)
+        
+        if result is None and self._db is not None:
+            result = await asyncio.to_thread(self._load, key)
+            if result is not None:
+                self._memory[key] = result
+        
+        if result is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        # 返回副本，避免调用方修改污染缓存
+        return dict(result)
+    
+    async def set(self, key: str, value: Dict[str, Any]):
+        """写入缓存"""
+        self._memory[key] = dict(value)
+        
+        if self._db is not None:
+            await asyncio.to_thread(self._save, key, orjson.dumps(value).decode())
+    
+    def _save(self, key: str, value: str):
+        """写入 SQLite（在工作线程中执行）"""
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, time.time())
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            log.warning(f"LLM 缓存写入失败: {e}")
+    
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """从 SQLite 读取未过期的缓存（在工作线程中执行）"""
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                
+                if row is None:
+                    return None
+                
+                value, created_at = row
+                if time.time() - created_at > self._ttl:
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    return None
+            
+            return orjson.loads(value)
+            
+        except sqlite3.Error as e:
+            log.warning(f"LLM 缓存读取失败: {e}")
+            return None
+    
+    def clear(self):
+        """清空缓存"""
+        self._memory.clear()
+        self.hits = 0
+        self.misses = 0
+        
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM llm_cache")
+                    self._db.commit()
+            except sqlite3.Error as e:
+                log.warning(f"清空 LLM 缓存失败: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+            "persistent": self._db is not None,
+        }
+
 
 class LLMBrain:
     """
@@ -29,33 +257,141 @@ class LLMBrain:
         """
         self.config = get_config().llm
         self.provider = provider or self.config.provider
+        self._session_id = uuid.uuid4().hex
+        self._clients: Dict[LLMProvider, AsyncOpenAI] = {}
         self._client: Optional[AsyncOpenAI] = None
+        self._warmed_urls: set = set()
+        self._warmup_tasks: set = set()
         self._init_client()
         
+        # 响应缓存
+        cache_config = get_config().cache
+        self._cache: Optional[ResponseCache] = None
+        if cache_config.response_cache_enabled:
+            self._cache = ResponseCache(
+                maxsize=cache_config.response_cache_size,
+                ttl=cache_config.response_cache_ttl,
+                db_path=cache_config.response_cache_db,
+            )
+        
+        # 语义缓存（模型由 warm_up 在后台加载）
+        self.semantic_cache: Optional[SemanticCache] = None
+        if cache_config.semantic_cache_enabled:
+            self.semantic_cache = SemanticCache(
+                model_name=cache_config.semantic_cache_model,
+                threshold=cache_config.semantic_cache_threshold,
+                max_entries=cache_config.semantic_cache_size,
+            )
+        
         log.info(f"LLM Brain 初始化完成，使用 {self.provider.value}")
     
     def _init_client(self):
-        """初始化 OpenAI 兼容客户端"""
-        if self.provider == LLMProvider.OPENAI:
-            self._client = AsyncOpenAI(
+        """切换到当前提供商的客户端（每个提供商只创建一次，切换时复用已有连接）"""
+        self._client = self._get_client(self.provider)
+        self._model = self._model_for(self.provider)
+    
+    def _get_client(self, provider: LLMProvider) -> AsyncOpenAI:
+        """获取提供商的客户端，首次使用时创建"""
+        if provider not in self._clients:
+            self._clients[provider] = self._make_client(provider)
+        return self._clients[provider]
+    
+    def _make_client(self, provider: LLMProvider) -> AsyncOpenAI:
+        """创建 OpenAI 兼容客户端，并在后台预热连接"""
+        if provider == LLMProvider.OPENAI:
+            client = AsyncOpenAI(
                 api_key=self.config.openai_api_key,
                 base_url=self.config.openai_base_url,
+                http_client=get_shared_http_client(),
+                max_retries=0,  # 重试统一由 _api_retry 负责
             )
-            self._model = self.config.openai_model
             
-        elif self.provider == LLMProvider.DEEPSEEK:
-            self._client = AsyncOpenAI(
+        elif provider == LLMProvider.DEEPSEEK:
+            client = AsyncOpenAI(
                 api_key=self.config.deepseek_api_key,
                 base_url=self.config.deepseek_base_url,
+                http_client=get_shared_http_client(),
+                max_retries=0,  # 重试统一由 _api_retry 负责
             )
-            self._model = self.config.deepseek_model
             
-        elif self.provider == LLMProvider.OLLAMA:
-            self._client = AsyncOpenAI(
+        elif provider == LLMProvider.OLLAMA:
+            client = AsyncOpenAI(
                 api_key="ollama",  # Ollama 不需要真实 key
                 base_url=f"{self.config.ollama_base_url}/v1",
+                http_client=get_shared_http_client(),
+                max_retries=0,  # 重试统一由 _api_retry 负责
             )
-            self._model = self.config.ollama_model
+        
+        else:
+            raise ValueError(f"不支持的 LLM 提供商: {provider}")
+        
+        # 已在事件循环中时立即预热，否则留给 warm_up
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            task = asyncio.create_task(self.prewarm_connection(client))
+            self._warmup_tasks.add(task)
+            task.add_done_callback(self._warmup_tasks.discard)
+        
+        return client
+    
+    def _model_for(self, provider: LLMProvider) -> str:
+        """获取提供商对应的模型名称"""
+        if provider == LLMProvider.OPENAI:
+            return self.config.openai_model
+        if provider == LLMProvider.DEEPSEEK:
+            return self.config.deepseek_model
+        return self.config.ollama_model
+    
+    @property
+    def model(self) -> str:
+        """当前使用的模型名称"""
+        return self._model
+    
+    def _prepare_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按提供商处理消息中的 cache_control 标记
+        只有 Anthropic 兼容端点认识该字段，其余提供商（自动前缀缓存）发送前去掉
+        """
+        if self.config.forward_cache_control:
+            return messages
+        
+        if not any("cache_control" in m for m in messages):
+            return messages
+        
+        return [
+            {k: v for k, v in m.items() if k != "cache_control"} if "cache_control" in m else m
+            for m in messages
+        ]
+    
+    def _prompt_cache_kwargs(
+        self,
+        provider: Optional[LLMProvider] = None,
+        prompt_cache_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        提供商前缀缓存参数：OpenAI 按 prompt_cache_key 路由到同一缓存
+        调用方可传入静态前缀的摘要，未传入时按会话路由
+        """
+        if (provider or self.provider) == LLMProvider.OPENAI:
+            return {"extra_body": {"prompt_cache_key": prompt_cache_key or self._session_id}}
+        return {}
+    
+    @_api_retry
+    async def _call_api(self, kwargs: Dict[str, Any]):
+        """调用聊天接口（瞬时错误自动重试）"""
+        return await self._client.chat.completions.create(**kwargs)
+    
+    @_api_retry
+    async def _call_api_stream(self, kwargs: Dict[str, Any]):
+        """建立流式聊天请求（只重试建立连接阶段，已开始输出后不重试）"""
+        return await self._client.chat.completions.create(**kwargs)
+    
+    def _request_hash(self, messages: List[Dict[str, Any]]) -> str:
+        """请求摘要，用于日志关联（不记录提示词原文）"""
+        return ResponseCache.make_key(model=self._model, messages=messages)[:12]
     
     async def chat(
         self,
@@ -63,6 +399,8 @@ class LLMBrain:
         tools: Optional[List[Dict]] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        messages_digest: Optional[str] = None,
+        prompt_cache_key: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         发送聊天请求
@@ -72,52 +410,227 @@ class LLMBrain:
             tools: Function Calling 工具定义
             temperature: 温度参数
             max_tokens: 最大 token 数
+            messages_digest: 调用方已算好的 messages 摘要，传入时缓存键不再序列化整个消息列表
+            prompt_cache_key: 提供商前缀缓存的路由键
             
         Returns:
             完整响应字典，包含 content 和可能的 tool_calls
         """
+        if temperature is None:
+            temperature = self.config.temperature
+        max_tokens = max_tokens or self.config.max_tokens
+        
+        # 只缓存确定性请求（temperature == 0）
+        cache_key = None
+        if self._cache is not None and temperature == 0:
+            cache_key = ResponseCache.make_key(
+                model=self._model,
+                messages=messages if messages_digest is None else messages_digest,
+                tools=tools,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            cached = await self._cache.get(cache_key)
+            if cached is not None:
+                log.debug(f"LLM 缓存命中: {cache_key[:12]}")
+                return cached
+        
         try:
             kwargs = {
                 "model": self._model,
-                "messages": messages,
-                "temperature": temperature or self.config.temperature,
-                "max_tokens": max_tokens or self.config.max_tokens,
+                "messages": self._prepare_messages(messages),
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                **self._prompt_cache_kwargs(prompt_cache_key=prompt_cache_key),
             }
             
             if tools:
                 kwargs["tools"] = tools
                 kwargs["tool_choice"] = "auto"
             
-            response = await self._client.chat.completions.create(**kwargs)
-            message = response.choices[0].message
+            response = await self._call_api(kwargs)
+            result = self._parse_response(response)
             
-            result = {
-                "content": message.content or "",
-                "tool_calls": None,
-                "finish_reason": response.choices[0].finish_reason,
-            }
-            
-            if message.tool_calls:
-                result["tool_calls"] = [
-                    {
-                        "id": tc.id,
-                        "name": tc.function.name,
-                        "arguments": json.loads(tc.function.arguments),
-                    }
-                    for tc in message.tool_calls
-                ]
+            # 工具调用有副作用，不缓存
+            if cache_key and not result["tool_calls"]:
+                await self._cache.set(cache_key, result)
             
             return result
             
         except Exception as e:
-            log.error(f"LLM 请求失败: {e}")
+            log.error(f"LLM 请求失败 [{self._request_hash(messages)}]: {e}")
             raise
     
+    @staticmethod
+    def _parse_response(response) -> Dict[str, Any]:
+        """将 API 响应转换为结果字典"""
+        message = response.choices[0].message
+        
+        result = {
+            "content": message.content or "",
+            "tool_calls": None,
+            "finish_reason": response.choices[0].finish_reason,
+        }
+        
+        if message.tool_calls:
+            result["tool_calls"] = [
+                {
+                    "id": tc.id,
+                    "name": tc.function.name,
+                    # 原始 JSON 字符串，回填 assistant 消息时直接复用，无需再序列化
+                    "raw_arguments": tc.function.arguments,
+                    "arguments": orjson.loads(tc.function.arguments),
+                }
+                for tc in message.tool_calls
+            ]
+        
+        return result
+    
+    async def _call_with(self, provider: LLMProvider, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """使用指定提供商发送聊天请求"""
+        client = self._get_client(provider)
+        response = await client.chat.completions.create(
+            **kwargs,
+            model=self._model_for(provider),
+            **self._prompt_cache_kwargs(provider),
+        )
+        return self._parse_response(response)
+    
+    async def chat_race(
+        self,
+        messages: List[Dict[str, str]],
+        providers: List[LLMProvider],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        多提供商竞速
+        同时向多个提供商发送同一请求，返回最先成功的响应并取消其余请求。
+        token 成本约为 N 倍，仅用于对延迟敏感的场景
+        
+        Args:
+            messages: 消息列表
+            providers: 参与竞速的提供商
+            tools: Function Calling 工具定义
+            temperature: 温度参数
+            max_tokens: 最大 token 数
+            
+        Returns:
+            完整响应字典，格式同 chat
+        """
+        kwargs = {
+            "messages": self._prepare_messages(messages),
+            "temperature": self.config.temperature if temperature is None else temperature,
+            "max_tokens": max_tokens or self.config.max_tokens,
+        }
+        
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        
+        try:
+            _, result = await self._race(providers, lambda provider: self._call_with(provider, kwargs))
+        except Exception:
+            log.error(f"LLM 竞速请求全部失败 [{self._request_hash(messages)}]")
+            raise
+        
+        return result
+    
+    async def _race(
+        self,
+        providers: List[LLMProvider],
+        call: Callable[[LLMProvider], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Awaitable[Any]]] = None,
+    ) -> Tuple[LLMProvider, Any]:
+        """
+        对每个提供商并发执行 call，返回最先成功的 (提供商, 结果) 并取消其余请求
+        同时完成的落选结果交给 discard 释放；全部失败时抛出最后一个错误
+        """
+        pending = {asyncio.create_task(call(provider)): provider for provider in providers}
+        winner: Optional[Tuple[LLMProvider, Any]] = None
+        last_error: Optional[BaseException] = None
+        
+        try:
+            while pending and winner is None:
+                done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    provider = pending.pop(task)
+                    error = task.exception()
+                    
+                    if error is not None:
+                        log.warning(f"竞速请求失败 ({provider.value}): {error}")
+                        last_error = error
+                    elif winner is None:
+                        winner = (provider, task.result())
+                    elif discard is not None:
+                        await discard(task.result())
+        finally:
+            # 取消仍在进行的请求
+            for task in pending:
+                task.cancel()
+        
+        if winner is None:
+            raise last_error or ValueError("未指定参与竞速的提供商")
+        
+        log.debug(f"竞速请求由 {winner[0].value} 胜出")
+        return winner
+    
+    async def _open_stream_with(
+        self,
+        provider: LLMProvider,
+        kwargs: Dict[str, Any],
+        prompt_cache_key: Optional[str] = None,
+    ):
+        """使用指定提供商建立流式请求并等待首个片段，返回 (流, 首个片段)"""
+        client = self._get_client(provider)
+        stream = await client.chat.completions.create(
+            **kwargs,
+            model=self._model_for(provider),
+            **self._prompt_cache_kwargs(provider, prompt_cache_key),
+        )
+        
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await stream.close()
+            raise
+        
+        return stream, first
+    
+    async def _race_stream(
+        self,
+        providers: List[LLMProvider],
+        kwargs: Dict[str, Any],
+        prompt_cache_key: Optional[str] = None,
+    ):
+        """流式竞速：首个片段最先到达的提供商胜出，之后只读取它的流"""
+        _, (stream, first) = await self._race(
+            providers,
+            lambda provider: self._open_stream_with(provider, kwargs, prompt_cache_key),
+            discard=lambda opened: opened[0].close(),
+        )
+        
+        try:
+            if first is not None:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.close()
+    
     async def chat_stream(
         self,
         messages: List[Dict[str, str]],
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        tools: Optional[List[Dict]] = None,
+        tool_calls: Optional[List[Dict]] = None,
+        prompt_cache_key: Optional[str] = None,
+        providers: Optional[List[LLMProvider]] = None,
     ) -> AsyncGenerator[str, None]:
         """
         流式聊天请求
@@ -126,26 +639,65 @@ class LLMBrain:
             messages: 消息列表
             temperature: 温度参数
             max_tokens: 最大 token 数
+            tools: Function Calling 工具定义
+            tool_calls: 传入列表时，流结束后将模型请求的工具调用追加到其中（格式同 chat）
+            prompt_cache_key: 提供商前缀缓存的路由键
+            providers: 非空时向这些提供商竞速，首个片段最先到达者胜出（成本约 N 倍）
             
         Yields:
             生成的文本片段
         """
+        kwargs = {
+            "messages": self._prepare_messages(messages),
+            "temperature": self.config.temperature if temperature is None else temperature,
+            "max_tokens": max_tokens or self.config.max_tokens,
+            "stream": True,
+        }
+        
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        
+        # 工具调用以增量片段返回，按 index 拼接
+        pending: Dict[int, Dict[str, Any]] = {}
+        
         try:
-            response = await self._client.chat.completions.create(
-                model=self._model,
-                messages=messages,
-                temperature=temperature or self.config.temperature,
-                max_tokens=max_tokens or self.config.max_tokens,
-                stream=True,
-            )
+            if providers:
+                response = self._race_stream(providers, kwargs, prompt_cache_key)
+            else:
+                response = await self._call_api_stream({
+                    **kwargs,
+                    "model": self._model,
+                    **self._prompt_cache_kwargs(prompt_cache_key=prompt_cache_key),
+                })
             
             async for chunk in response:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+                if not chunk.choices:
+                    continue
+                
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield delta.content
+                
+                for tc in delta.tool_calls or []:
+                    entry = pending.setdefault(tc.index, {"id": "", "name": "", "raw_arguments": ""})
+                    if tc.id:
+                        entry["id"] = tc.id
+                    if tc.function:
+                        if tc.function.name:
+                            entry["name"] = tc.function.name
+                        if tc.function.arguments:
+                            entry["raw_arguments"] += tc.function.arguments
                     
         except Exception as e:
-            log.error(f"LLM 流式请求失败: {e}")
+            log.error(f"LLM 流式请求失败 [{self._request_hash(messages)}]: {e}")
             raise
+        
+        if tool_calls is not None:
+            for _, entry in sorted(pending.items()):
+                entry["raw_arguments"] = entry["raw_arguments"] or "{}"
+                entry["arguments"] = orjson.loads(entry["raw_arguments"])
+                tool_calls.append(entry)
     
     async def simple_chat(self, user_message: str, system_prompt: Optional[str] = None) -> str:
         """
@@ -158,6 +710,13 @@ class LLMBrain:
         Returns:
             AI 回复文本
         """
+        scope = system_prompt or ""
+        
+        if self.semantic_cache is not None:
+            cached = await self.semantic_cache.lookup(user_message, scope=scope)
+            if cached is not None:
+                return cached
+        
         messages = []
         
         if system_prompt:
@@ -166,30 +725,158 @@ class LLMBrain:
         messages.append({"role": "user", "content": user_message})
         
         response = await self.chat(messages)
+        
+        if self.semantic_cache is not None:
+            await self.semantic_cache.store(user_message, response["content"], scope=scope)
+        
         return response["content"]
     
+    async def batch_chat(
+        self,
+        requests: List[Dict[str, Any]],
+        poll_interval: float = 30.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        通过 Batch API 批量提交离线请求
+        价格约为实时接口的一半，适合记忆压缩、评测等非交互任务
+        
+        Args:
+            requests: 请求列表，每项包含 messages，可选 temperature / max_tokens
+            poll_interval: 轮询任务状态的间隔（秒）
+            
+        Returns:
+            与 requests 顺序一致的结果列表 [{"content", "finish_reason", "error"}]
+        """
+        if self.provider == LLMProvider.OLLAMA:
+            raise NotImplementedError("Ollama 不支持 Batch API")
+        
+        if not requests:
+            return []
+        
+        lines = []
+        for i, req in enumerate(requests):
+            temperature = req.get("temperature")
+            body = {
+                "model": self._model,
+                "messages": self._prepare_messages(req["messages"]),
+                "temperature": self.config.temperature if temperature is None else temperature,
+                "max_tokens": req.get("max_tokens") or self.config.max_tokens,
+            }
+            lines.append(orjson.dumps({
+                "custom_id": f"request-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }).decode())
+        
+        # 1. 上传请求文件（JSONL）
+        input_file = await self._client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        
+        # 2. 创建批处理任务
+        batch = await self._client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        log.info(f"已提交 Batch 任务 {batch.id}，共 {len(requests)} 条请求")
+        
+        # 3. 轮询直到结束
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self._client.batches.retrieve(batch.id)
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch 任务 {batch.id} 未完成: {batch.status}")
+        
+        # 4. 下载并解析结果
+        content = await self._client.files.content(batch.output_file_id)
+        
+        outputs: Dict[str, Dict[str, Any]] = {}
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            
+            item = orjson.loads(line)
+            response = item.get("response") or {}
+            
+            if item.get("error") or response.get("status_code") != 200:
+                outputs[item["custom_id"]] = {
+                    "content": "",
+                    "finish_reason": None,
+                    "error": str(item.get("error") or response.get("body")),
+                }
+                continue
+            
+            choice = response["body"]["choices"][0]
+            outputs[item["custom_id"]] = {
+                "content": choice["message"].get("content") or "",
+                "finish_reason": choice.get("finish_reason"),
+                "error": None,
+            }
+        
+        log.info(f"Batch 任务 {batch.id} 完成")
+        
+        # 按 custom_id 还原请求顺序，缺失的条目视为失败
+        return [
+            outputs.get(f"request-{i}", {"content": "", "finish_reason": None, "error": "无返回结果"})
+            for i in range(len(requests))
+        ]
+    
     def get_system_prompt(self) -> str:
-        """获取 JARVIS 系统提示词"""
-        return """你是 JARVIS，一个智能 AI 助手，由用户创建来帮助管理日常任务和操作电脑。
-
-你的核心特征：
-1. 专业、高效、简洁的回答风格
-2. 像钢铁侠里的JARVIS一样，礼貌但不啰嗦
-3. 能够理解和执行用户的各种指令
-4. 对于危险操作会主动提醒并请求确认
-
-你可以使用的能力：
-- 系统控制：打开应用、调节音量、执行命令
-- 文件管理：读取、创建、移动、删除文件
-- 网页浏览：搜索信息、打开网页
-- 智能家居：控制 IoT 设备（如已配置）
-
-当用户发出指令时，你需要分析意图并调用相应的工具来完成任务。
-如果不确定用户的意图，请主动询问确认。
-对于危险操作（如删除文件、执行系统命令），请务必在执行前确认。"""
+        """获取 JARVIS 系统提示词（模块级常量，每次返回同一对象）"""
+        return JARVIS_SYSTEM_PROMPT
 
+    async def warm_up(self):
+        """后台预热：建立到 API 的连接、加载语义缓存模型"""
+        tasks = [self.prewarm_connection()]
+        if self.semantic_cache is not None:
+            tasks.append(self.semantic_cache.warm_up())
+        await asyncio.gather(*tasks)
+    
+    async def prewarm_connection(self, client: Optional[AsyncOpenAI] = None):
+        """向 API 地址发送 HEAD 请求，提前完成 TCP/TLS 握手（每个地址只预热一次）"""
+        url = str((client or self._client).base_url)
+        if url in self._warmed_urls:
+            return
+        self._warmed_urls.add(url)
+        
+        try:
+            await get_shared_http_client().head(url, timeout=5.0)
+            log.debug(f"已预热连接: {url}")
+        except httpx.HTTPError as e:
+            log.debug(f"连接预热失败（忽略）: {e}")
+    
+    async def aclose(self):
+        """关闭共享的 HTTP 连接池"""
+        global _shared_http_client
+        
+        for task in self._warmup_tasks:
+            task.cancel()
+        
+        if _shared_http_client is not None and not _shared_http_client.is_closed:
+            await _shared_http_client.aclose()
+        _shared_http_client = None
+        self._clients.clear()
+    
+    def clear_cache(self):
+        """清空 LLM 响应缓存和语义缓存"""
+        if self._cache is not None:
+            self._cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+        log.info("LLM 缓存已清空")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取 LLM 响应缓存统计"""
+        if self._cache is None:
+            return {"hits": 0, "misses": 0, "size": 0, "persistent": False}
+        return self._cache.get_stats()
+    
     def switch_provider(self, provider: LLMProvider):
-        """切换 LLM 提供商"""
+        """切换 LLM 提供商（复用已创建的客户端，切回时无需重新握手）"""
         self.provider = provider
         self._init_client()
         log.info(f"已切换到 {provider.value}")
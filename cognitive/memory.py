@@ -214,6 +214,84 @@ class MemoryManager:
         
         return messages
     
+    async def compact_long_term(self, brain, chunk_size: int = 20, max_chunks: int = 50) -> int:
+        """
+        压缩长期记忆：将旧对话分块总结为摘要
+        通过 Batch API 离线执行，适合定时任务调用
+        
+        Args:
+            brain: LLMBrain 实例
+            chunk_size: 每条摘要覆盖的对话条数
+            max_chunks: 单次最多生成的摘要数
+            
+        Returns:
+            生成的摘要条数
+        """
+        if not self._collection:
+            return 0
+        
+        try:
+            records = self._collection.get(
+                where={"role": {"$ne": "summary"}},
+                limit=chunk_size * max_chunks,
+            )
+        except Exception as e:
+            log.error(f"读取长期记忆失败: {e}")
+            return 0
+        
+        if not records["ids"]:
+            return 0
+        
+        # 按时间排序后分块
+        entries = sorted(
+            zip(records["ids"], records["documents"], records["metadatas"]),
+            key=lambda entry: entry[2].get("timestamp", ""),
+        )
+        chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+        
+        requests = [
+            {
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "请将以下对话记录总结为简洁的要点，保留用户偏好、关键事实和待办事项。",
+                    },
+                    {
+                        "role": "user",
+                        "content": "\n".join(
+                            f"[{metadata.get('role', 'unknown')}] {doc}"
+                            for _, doc, metadata in chunk
+                        ),
+                    },
+                ],
+                "temperature": 0,
+            }
+            for chunk in chunks
+        ]
+        
+        results = await brain.batch_chat(requests)
+        
+        count = 0
+        for chunk, result in zip(chunks, results):
+            if result["error"] or not result["content"]:
+                continue
+            
+            timestamp = chunk[-1][2].get("timestamp", datetime.now().isoformat())
+            
+            try:
+                self._collection.add(
+                    documents=[result["content"]],
+                    metadatas=[{"role": "summary", "timestamp": timestamp}],
+                    ids=[f"summary_{timestamp}"]
+                )
+                self._collection.delete(ids=[doc_id for doc_id, _, _ in chunk])
+                count += 1
+            except Exception as e:
+                log.error(f"保存记忆摘要失败: {e}")
+        
+        log.info(f"长期记忆压缩完成，生成 {count} 条摘要")
+        return count
+    
     def clear_short_term(self):
         """清空短期记忆"""
         # 先保存到长期记忆
@@ -5,25 +5,46 @@ JARVIS ReAct 任务规划器
 Author: gngdingghuan
 """
 
-import json
 import re
-from typing import Dict, List, Any, Optional, Callable
+import asyncio
+import hashlib
+from typing import Dict, List, Any, Optional, Callable, AsyncGenerator
 from dataclasses import dataclass
 
-from cognitive.llm_brain import LLMBrain
+import orjson
+
+from cognitive.llm_brain import LLMBrain, JARVIS_SYSTEM_PROMPT, JARVIS_SYSTEM_PROMPT_BYTES
 from cognitive.memory import MemoryManager
 from cognitive.context_manager import ContextManager
+from config import get_config, LLMProvider
+from skills.base_skill import SkillResult
 from utils.logger import log
+from utils.token_budget import MessageTracker
+
+
+# 检测到重复工具调用时注入的提示
+_REPEAT_NUDGE = "你正在重复调用同一个工具，请直接给出最终答案"
 
 
 @dataclass
-class SkillResult:
-    """技能执行结果"""
-    success: bool
-    output: Any
-    error: Optional[str] = None
-    needs_confirmation: bool = False
-    confirmation_message: Optional[str] = None
+class SkillCapabilities:
+    """技能能力（对技能做一次属性探测后缓存，避免热路径上反复 hasattr）"""
+    get_schema: Optional[Callable] = None
+    description: Optional[str] = None
+    needs_confirmation: Optional[Callable] = None
+    sequential: bool = False
+    idempotent: bool = True
+    
+    @classmethod
+    def probe(cls, skill: Any) -> "SkillCapabilities":
+        """探测技能支持的接口"""
+        return cls(
+            get_schema=getattr(skill, 'get_schema', None),
+            description=getattr(skill, 'description', None),
+            needs_confirmation=getattr(skill, 'needs_confirmation', None),
+            sequential=bool(getattr(skill, 'sequential', False)),
+            idempotent=bool(getattr(skill, 'idempotent', True)),
+        )
 
 
 class ReActPlanner:
@@ -32,7 +53,7 @@ class ReActPlanner:
     实现 感知 -> 思考 -> 行动 -> 观察 -> 反思 循环
     """
     
-    MAX_ITERATIONS = 10  # 最大循环次数，防止无限循环
+    MAX_CONCURRENT_TOOLS = 8  # 单轮并发执行的工具调用上限
     
     def __init__(
         self,
@@ -40,6 +61,7 @@ class ReActPlanner:
         memory: MemoryManager,
         context: ContextManager,
         skills: Optional[Dict[str, Any]] = None,
+        race_providers: Optional[List[LLMProvider]] = None,
     ):
         """
         初始化规划器
@@ -49,55 +71,91 @@ class ReActPlanner:
             memory: 记忆管理器
             context: 上下文管理器
             skills: 技能字典 {skill_name: skill_instance}
+            race_providers: 非空时每轮请求同时发给这些提供商和当前提供商，取最快的响应（成本约 N 倍），
+                未传入时使用 LLM_RACE_PROVIDERS 配置
         """
         self.brain = brain
         self.memory = memory
         self.context = context
         self.skills = skills or {}
         
+        config = get_config()
+        self.llm_config = config.llm
+        if race_providers is None:
+            race_providers = self._parse_providers(config.llm.race_providers)
+        self.race_providers = race_providers
+        self.max_iterations = config.react_max_iterations
+        self.repeat_break = config.react_repeat_break
+        
         # 确认回调函数
         self._confirmation_callback: Optional[Callable] = None
         
+        # 系统提示词静态部分和工具定义缓存，注册技能时失效
+        self._static_prompt: Optional[str] = None
+        self._static_prompt_key: Optional[str] = None
+        self._tools_schema_cached: Optional[List[Dict]] = None
+        
+        # 技能能力缓存（首次使用时探测，懒加载技能不会在启动时被实例化）
+        self._skill_caps: Dict[str, SkillCapabilities] = {}
+        
         log.info(f"ReAct 规划器初始化完成，已注册 {len(self.skills)} 个技能")
     
     def register_skill(self, name: str, skill: Any):
         """注册技能"""
         self.skills[name] = skill
+        self._static_prompt = None
+        self._static_prompt_key = None
+        self._tools_schema_cached = None
+        self._skill_caps.pop(name, None)
         log.debug(f"已注册技能: {name}")
     
     def set_confirmation_callback(self, callback: Callable):
         """设置确认回调函数"""
         self._confirmation_callback = callback
     
+    def _get_caps(self, name: str) -> SkillCapabilities:
+        """获取技能能力（每个技能只探测一次）"""
+        caps = self._skill_caps.get(name)
+        if caps is None:
+            caps = self._skill_caps[name] = SkillCapabilities.probe(self.skills[name])
+        return caps
+    
     def _get_tools_schema(self) -> List[Dict]:
-        """获取所有技能的 Function Calling Schema"""
+        """获取所有技能的 Function Calling Schema（首次构建后缓存）"""
+        if self._tools_schema_cached is not None:
+            return self._tools_schema_cached
+        
         tools = []
-        for name, skill in self.skills.items():
-            if hasattr(skill, 'get_schema'):
-                schema = skill.get_schema()
+        for name in self.skills:
+            get_schema = self._get_caps(name).get_schema
+            if get_schema is not None:
+                schema = get_schema()
                 if schema:
                     tools.append(schema)
+        
+        self._tools_schema_cached = tools
         return tools
     
-    def _build_system_prompt(self) -> str:
-        """构建系统提示词"""
-        base_prompt = self.brain.get_system_prompt()
+    def _static_prefix(self) -> str:
+        """
+        获取系统提示词的静态部分（人设 + 技能列表 + 规则）
+        跨轮次保持字节级一致，供提供商的前缀缓存命中；注册技能时失效
+        """
+        if self._static_prompt is not None:
+            return self._static_prompt
         
-        # 添加上下文信息
-        context_summary = self.context.get_context_summary()
+        base_prompt = self.brain.get_system_prompt()
         
-        # 添加可用技能列表
+        # 按名称排序，保证前缀稳定
         skill_list = []
-        for name, skill in self.skills.items():
-            if hasattr(skill, 'description'):
-                skill_list.append(f"- {name}: {skill.description}")
+        for name in sorted(self.skills):
+            description = self._get_caps(name).description
+            if description is not None:
+                skill_list.append(f"- {name}: {description}")
         
         skills_text = "\n".join(skill_list) if skill_list else "暂无可用技能"
         
-        full_prompt = f"""{base_prompt}
-
-当前上下文信息：
-{context_summary}
+        suffix = f"""
 
 可用技能列表：
 {skills_text}
@@ -107,159 +165,488 @@ class ReActPlanner:
 2. 如果任务需要多个步骤，请逐步执行并观察结果
 3. 对于危险操作，系统会自动请求用户确认
 4. 如果无法完成任务，请如实告知原因"""
+        self._static_prompt = base_prompt + suffix
+        
+        # 默认提示词已预先编码，只需编码技能列表部分
+        hasher = hashlib.blake2b(digest_size=16)
+        if base_prompt is JARVIS_SYSTEM_PROMPT:
+            hasher.update(JARVIS_SYSTEM_PROMPT_BYTES)
+        else:
+            hasher.update(base_prompt.encode("utf-8"))
+        hasher.update(suffix.encode("utf-8"))
+        self._static_prompt_key = hasher.hexdigest()
         
-        return full_prompt
+        return self._static_prompt
     
-    async def plan_and_execute(self, user_input: str) -> str:
+    def _prefix_cache_key(self) -> str:
+        """静态前缀的摘要，作为提供商前缀缓存的路由键（同一前缀的请求路由到同一缓存）"""
+        if self._static_prompt_key is None:
+            self._static_prefix()
+        return self._static_prompt_key
+    
+    @staticmethod
+    def _dynamic_suffix(context_summary: str) -> str:
+        """系统提示词的动态部分（当前上下文）"""
+        return f"当前上下文信息：\n{context_summary}"
+    
+    def _build_system_prompt(self) -> List[Dict[str, Any]]:
         """
-        规划并执行用户请求
+        构建系统提示词消息
+        静态前缀带 cache_control 标记，动态上下文单独放在第二条 system 消息
+        """
+        return [
+            {
+                "role": "system",
+                "content": self._static_prefix(),
+                "cache_control": {"type": "ephemeral"},
+            },
+            {
+                "role": "system",
+                "content": self._dynamic_suffix(self.context.get_context_summary()),
+            },
+        ]
+    
+    @staticmethod
+    def _parse_providers(names: List[str]) -> List[LLMProvider]:
+        """解析配置中的提供商名称，忽略未知名称"""
+        providers = []
+        for name in names:
+            try:
+                providers.append(LLMProvider(name))
+            except ValueError:
+                log.warning(f"LLM_RACE_PROVIDERS 中的未知提供商 '{name}'，已忽略")
+        return providers
+    
+    def _race_targets(self) -> Optional[List[LLMProvider]]:
+        """
+        参与竞速的提供商
+        当前提供商（可能已通过 --provider 或 switch_provider 切换）始终在内，不足两个时不竞速
+        """
+        if not self.race_providers:
+            return None
+        targets = list(dict.fromkeys([self.brain.provider, *self.race_providers]))
+        return targets if len(targets) > 1 else None
+    
+    async def _chat(
+        self,
+        messages: List[Dict[str, Any]],
+        tracker: MessageTracker,
+        tools: Optional[List[Dict]] = None,
+    ) -> Dict[str, Any]:
+        """调用 LLM（开启竞速时同时请求多个提供商）"""
+        race_targets = self._race_targets()
+        if race_targets:
+            return await self.brain.chat_race(messages, race_targets, tools=tools)
+        return await self.brain.chat(
+            messages,
+            tools=tools,
+            messages_digest=tracker.hexdigest,
+            prompt_cache_key=self._prefix_cache_key(),
+        )
+    
+    def _start_turn(self, user_input: str):
+        """
+        开始一轮对话：写入记忆并构建初始消息
         
-        Args:
-            user_input: 用户输入
-            
         Returns:
-            最终回复
+            (messages, tools, tracker)
         """
-        log.info(f"开始处理用户请求: {user_input[:50]}...")
-        
         # 添加到记忆
         self.memory.add_message("user", user_input)
         
-        # 获取上下文和历史
-        messages = []
+        # 系统提示词和工具定义在同一轮的 ReAct 循环中不变，只在进入循环前计算一次
+        messages = self._build_system_prompt()
+        tools = self._get_tools_schema()
+        
+        # 历史对话
+        messages.extend(self.memory.get_recent_context())
         
-        # 系统提示词
+        # 之后每轮只追加消息，摘要和 token 数增量更新
+        tracker = MessageTracker(self.brain.model, messages)
+        
+        return messages, tools, tracker
+    
+    @staticmethod
+    def _append_tool_round(
+        messages: List[Dict[str, Any]],
+        content: str,
+        tool_calls: List[Dict],
+        tool_results: List[Dict],
+    ):
+        """将工具调用和结果添加到消息"""
         messages.append({
-            "role": "system",
-            "content": self._build_system_prompt()
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [
+                {
+                    "id": tc["id"],
+                    "type": "function",
+                    "function": {
+                        "name": tc["name"],
+                        "arguments": tc["raw_arguments"]
+                    }
+                }
+                for tc in tool_calls
+            ]
         })
         
-        # 历史对话
-        messages.extend(self.memory.get_recent_context())
+        for tc, result in zip(tool_calls, tool_results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tc["id"],
+                "content": orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode()
+            })
+    
+    async def _fit_token_budget(self, messages: List[Dict[str, Any]], tracker: MessageTracker):
+        """
+        将消息总 token 数控制在预算内（原地修改）
+        1. 先丢弃本轮之前最早的历史消息（system 消息保留）
+        2. 仍超出时，把本轮较早的工具调用轮次压缩成一条摘要，只保留最近一轮原文
+        """
+        tracker.update(messages)
         
-        # 获取工具定义
-        tools = self._get_tools_schema()
+        budget = self.llm_config.max_tokens_budget
+        if tracker.tokens <= budget:
+            return
         
-        # ReAct 循环
+        try:
+            await self._shrink_messages(messages, list(tracker.counts), tracker.tokens, budget)
+        finally:
+            # 消息被原地裁剪或替换，增量状态失效
+            tracker.reset(messages)
+    
+    async def _shrink_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        counts: List[int],
+        total: int,
+        budget: int,
+    ):
+        """丢弃历史消息、压缩较早的工具调用轮次，直到不超过预算"""
+        # 本轮用户输入之后只有 assistant / tool 消息
+        turn_start = max(
+            (i for i, m in enumerate(messages) if m["role"] == "user"),
+            default=len(messages),
+        )
+        
+        # 1. 丢弃最早的历史消息
+        i = 0
+        dropped = 0
+        while total > budget and i < turn_start:
+            if messages[i]["role"] == "system":
+                i += 1
+                continue
+            total -= counts.pop(i)
+            messages.pop(i)
+            turn_start -= 1
+            dropped += 1
+        
+        if dropped:
+            log.info(f"消息超出 token 预算，已丢弃 {dropped} 条历史消息")
+        
+        if total <= budget:
+            return
+        
+        # 2. 压缩本轮较早的工具调用轮次
+        round_starts = [
+            j for j in range(turn_start + 1, len(messages))
+            if messages[j]["role"] == "assistant" and messages[j].get("tool_calls")
+        ]
+        if len(round_starts) < 2:
+            log.warning(f"消息仍超出 token 预算（{total} > {budget}），无可压缩内容")
+            return
+        
+        start, end = round_starts[0], round_starts[-1]
+        old_rounds = messages[start:end]
+        n_calls = sum(len(m.get("tool_calls") or []) for m in old_rounds)
+        summary = await self._summarize_tool_rounds(old_rounds)
+        
+        messages[start:end] = [{
+            "role": "system",
+            "content": f"[之前 {n_calls} 次工具调用的摘要]\n{summary}",
+        }]
+        log.info(f"已将 {n_calls} 次较早的工具调用压缩为摘要")
+    
+    async def _summarize_tool_rounds(self, rounds: List[Dict[str, Any]]) -> str:
+        """总结若干轮工具调用及其结果"""
+        lines = []
+        for m in rounds:
+            if m["role"] == "assistant":
+                for tc in m.get("tool_calls") or []:
+                    lines.append(f"调用 {tc['function']['name']}: {tc['function']['arguments']}")
+            elif m["role"] == "tool":
+                lines.append(f"结果: {m['content'][:2000]}")
+        
+        transcript = "\n".join(lines)
+        
+        try:
+            response = await self.brain.chat(
+                [
+                    {"role": "system", "content": "请简要总结以下工具调用及其结果，保留完成任务所需的关键信息。"},
+                    {"role": "user", "content": transcript},
+                ],
+                temperature=0,
+                max_tokens=512,
+            )
+            return response["content"]
+        except Exception as e:
+            log.warning(f"工具调用摘要失败，改为截断: {e}")
+            return transcript[:2000] + "...(已截断)"
+    
+    @staticmethod
+    def _call_key(tool_call: Dict[str, Any]) -> bytes:
+        """工具调用指纹：名称 + 按键排序的参数"""
+        args = orjson.dumps(
+            tool_call.get("arguments") or {},
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        )
+        return hashlib.blake2b(tool_call["name"].encode("utf-8") + args, digest_size=16).digest()
+    
+    def _is_repeating(self, tool_calls: List[Dict], seen: Dict[bytes, int]) -> bool:
+        """
+        记录本轮的工具调用，同一调用跨轮累计次数达到阈值时返回 True
+        同一响应内的重复调用只计一次（由 _execute_tool_calls 合并执行）
+        """
+        repeating = False
+        for key in {self._call_key(tc) for tc in tool_calls}:
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] >= self.repeat_break:
+                repeating = True
+        return repeating
+    
+    @staticmethod
+    def _nudge_final(messages: List[Dict[str, Any]]):
+        """模型在原地打转，提示其直接给出最终答案"""
+        log.warning("检测到重复的工具调用，提前结束循环")
+        messages.append({"role": "system", "content": _REPEAT_NUDGE})
+    
+    async def _ask(
+        self,
+        messages: List[Dict[str, Any]],
+        tracker: MessageTracker,
+        tools: Optional[List[Dict]],
+        tool_calls: List[Dict],
+    ) -> AsyncGenerator[str, None]:
+        """非流式请求 LLM：一次产出整段回复（可命中响应缓存）"""
+        response = await self._chat(messages, tracker, tools=tools)
+        tool_calls.extend(response.get("tool_calls") or [])
+        if response.get("content"):
+            yield response["content"]
+    
+    async def _ask_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tracker: MessageTracker,
+        tools: Optional[List[Dict]],
+        tool_calls: List[Dict],
+    ) -> AsyncGenerator[str, None]:
+        """流式请求 LLM：文本片段到达即产出"""
+        async for chunk in self.brain.chat_stream(
+            messages,
+            tools=tools,
+            tool_calls=tool_calls,
+            prompt_cache_key=self._prefix_cache_key(),
+            providers=self._race_targets(),
+        ):
+            yield chunk
+    
+    async def _react_loop(self, user_input: str, ask: Callable) -> AsyncGenerator[str, None]:
+        """
+        ReAct 循环（流式与非流式共用）
+        每轮请求 LLM 并产出文本片段；若该轮请求了工具，执行工具后继续循环，否则该轮即为最终回复
+        
+        Args:
+            user_input: 用户输入
+            ask: 每轮请求 LLM 的方法 ask(messages, tracker, tools, tool_calls)，
+                产出文本片段，并将模型请求的工具调用追加到 tool_calls
+            
+        Yields:
+            回复文本片段
+        """
+        log.info(f"开始处理用户请求: {user_input[:50]}...")
+        
+        messages, tools, tracker = self._start_turn(user_input)
+        
+        # 已输出的全部文本，结束后写入记忆
+        buffer = ""
         iteration = 0
-        final_response = ""
+        seen: Dict[bytes, int] = {}
+        force_final = False
+        # 刚检测到重复调用：即使已到步数上限，也再给模型一次不带工具的作答机会
+        final_pending = False
         
-        while iteration < self.MAX_ITERATIONS:
+        while iteration < self.max_iterations or final_pending:
             iteration += 1
+            final_pending = False
             log.debug(f"ReAct 循环第 {iteration} 次")
             
             try:
-                # 调用 LLM
-                response = await self.brain.chat(messages, tools=tools if tools else None)
+                await self._fit_token_budget(messages, tracker)
                 
-                # 检查是否有工具调用
-                if response.get("tool_calls"):
-                    # 执行工具调用
-                    tool_results = await self._execute_tool_calls(response["tool_calls"])
-                    
-                    # 将工具调用和结果添加到消息
-                    messages.append({
-                        "role": "assistant",
-                        "content": response.get("content", ""),
-                        "tool_calls": [
-                            {
-                                "id": tc["id"],
-                                "type": "function",
-                                "function": {
-                                    "name": tc["name"],
-                                    "arguments": json.dumps(tc["arguments"], ensure_ascii=False)
-                                }
-                            }
-                            for tc in response["tool_calls"]
-                        ]
-                    })
-                    
-                    for tc, result in zip(response["tool_calls"], tool_results):
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tc["id"],
-                            "content": json.dumps(result, ensure_ascii=False)
-                        })
-                    
-                    # 继续循环，让 LLM 处理结果
-                    continue
+                content = ""
+                tool_calls: List[Dict] = []
                 
-                else:
-                    # 没有工具调用，直接返回回复
-                    final_response = response.get("content", "")
+                # 调用 LLM（检测到重复调用后不再提供工具）
+                async for chunk in ask(messages, tracker, tools if tools and not force_final else None, tool_calls):
+                    content += chunk
+                    buffer += chunk
+                    yield chunk
+                
+                # 没有工具调用，该轮即为最终回复
+                if not tool_calls:
                     break
-                    
+                
+                # 工具轮的说明文字与后续回复分段显示
+                if content:
+                    buffer += "\n\n"
+                    yield "\n\n"
+                
+                # 重复调用同一工具时不再执行，要求模型直接作答
+                if self._is_repeating(tool_calls, seen):
+                    self._nudge_final(messages)
+                    force_final = final_pending = True
+                    continue
+                
+                # 执行工具调用，并将调用和结果添加到消息，继续循环让 LLM 处理结果
+                tool_results = await self._execute_tool_calls(tool_calls)
+                self._append_tool_round(messages, content, tool_calls, tool_results)
+                
             except Exception as e:
                 log.error(f"ReAct 循环出错: {e}")
-                final_response = f"抱歉，处理请求时出现错误: {str(e)}"
+                error_message = f"抱歉，处理请求时出现错误: {str(e)}"
+                buffer += error_message
+                yield error_message
                 break
         
-        if iteration >= self.MAX_ITERATIONS:
+        else:
             log.warning("达到最大循环次数")
-            final_response = "抱歉，任务过于复杂，无法在限定步骤内完成。"
+            error_message = "抱歉，任务过于复杂，无法在限定步骤内完成。"
+            buffer += error_message
+            yield error_message
         
         # 保存回复到记忆
-        self.memory.add_message("assistant", final_response)
+        self.memory.add_message("assistant", buffer)
         
         log.info(f"请求处理完成，共 {iteration} 次循环")
-        return final_response
     
-    async def _execute_tool_calls(self, tool_calls: List[Dict]) -> List[Dict]:
-        """执行工具调用"""
-        results = []
+    async def plan_and_execute(self, user_input: str) -> str:
+        """
+        规划并执行用户请求
         
-        for tc in tool_calls:
-            name = tc["name"]
-            arguments = tc["arguments"]
-            
-            log.info(f"执行工具: {name}, 参数: {arguments}")
-            
-            if name not in self.skills:
-                results.append({
-                    "success": False,
-                    "error": f"未知的技能: {name}"
-                })
-                continue
+        Args:
+            user_input: 用户输入
             
-            skill = self.skills[name]
+        Returns:
+            最终回复
+        """
+        return "".join([chunk async for chunk in self._react_loop(user_input, self._ask)])
+    
+    async def plan_and_execute_stream(self, user_input: str) -> AsyncGenerator[str, None]:
+        """
+        规划并执行用户请求（流式输出）
+        
+        Args:
+            user_input: 用户输入
             
-            try:
-                # 检查是否需要确认
-                if hasattr(skill, 'needs_confirmation') and skill.needs_confirmation(arguments):
-                    if self._confirmation_callback:
+        Yields:
+            回复文本片段
+        """
+        async for chunk in self._react_loop(user_input, self._ask_stream):
+            yield chunk
+    
+    async def _execute_tool_calls(self, tool_calls: List[Dict]) -> List[Dict]:
+        """
+        执行工具调用
+        互不依赖的调用并发执行，结果顺序与 tool_calls 一致
+        """
+        # 同一轮中完全相同的调用（名称 + 参数）只执行一次，结果按下标分发
+        # 非幂等技能以下标为键，每次调用各自执行
+        groups: Dict[Any, List[int]] = {}
+        for i, tc in enumerate(tool_calls):
+            name = tc["name"]
+            idempotent = name not in self.skills or self._get_caps(name).idempotent
+            groups.setdefault(self._call_key(tc) if idempotent else i, []).append(i)
+        
+        if len(groups) < len(tool_calls):
+            log.debug(f"合并了 {len(tool_calls) - len(groups)} 个重复的工具调用")
+        
+        unique_calls = [tool_calls[indices[0]] for indices in groups.values()]
+        unique_results = await self._run_calls(unique_calls)
+        
+        results: List[Dict] = [{}] * len(tool_calls)
+        for indices, result in zip(groups.values(), unique_results):
+            for i in indices:
+                results[i] = result
+        return results
+    
+    async def _run_calls(self, tool_calls: List[Dict]) -> List[Dict]:
+        """执行一组工具调用（并发或串行）"""
+        # 确认提示串行化，避免多个命令行提示交错
+        confirm_lock = asyncio.Lock()
+        
+        # 任一技能要求顺序执行时，整轮退化为串行
+        if any(tc["name"] in self.skills and self._get_caps(tc["name"]).sequential for tc in tool_calls):
+            return [await self._run_one(tc, confirm_lock) for tc in tool_calls]
+        
+        sem = asyncio.Semaphore(self.MAX_CONCURRENT_TOOLS)
+        
+        async def _guarded(tc: Dict) -> Dict:
+            async with sem:
+                return await self._run_one(tc, confirm_lock)
+        
+        return list(await asyncio.gather(*(_guarded(tc) for tc in tool_calls)))
+    
+    async def _run_one(self, tc: Dict, confirm_lock: asyncio.Lock) -> Dict:
+        """执行单个工具调用（确认 + 执行 + 异常包装）"""
+        name = tc["name"]
+        arguments = tc["arguments"]
+        
+        log.info(f"执行工具: {name}, 参数: {arguments}")
+        
+        if name not in self.skills:
+            return {
+                "success": False,
+                "error": f"未知的技能: {name}"
+            }
+        
+        skill = self.skills[name]
+        needs_confirmation = self._get_caps(name).needs_confirmation
+        
+        try:
+            # 检查是否需要确认
+            if needs_confirmation is not None and needs_confirmation(arguments):
+                if self._confirmation_callback:
+                    async with confirm_lock:
                         confirmed = await self._confirmation_callback(
                             f"是否允许执行 '{name}' 操作？\n参数: {arguments}"
                         )
-                        if not confirmed:
-                            results.append({
-                                "success": False,
-                                "error": "用户拒绝执行此操作"
-                            })
-                            continue
-                
-                # 执行技能
-                result = await skill.execute(**arguments)
+                    if not confirmed:
+                        return {
+                            "success": False,
+                            "error": "用户拒绝执行此操作"
+                        }
+            
+            # 执行技能
+            result = await skill.execute(**arguments)
+            
+            if isinstance(result, SkillResult):
+                return {
+                    "success": result.success,
+                    "output": result.output,
+                    "error": result.error
+                }
+            
+            return {
+                "success": True,
+                "output": result
+            }
                 
-                if isinstance(result, SkillResult):
-                    results.append({
-                        "success": result.success,
-                        "output": result.output,
-                        "error": result.error
-                    })
-                else:
-                    results.append({
-                        "success": True,
-                        "output": result
-                    })
-                    
-            except Exception as e:
-                log.error(f"技能执行失败: {name}, 错误: {e}")
-                results.append({
-                    "success": False,
-                    "error": str(e)
-                })
-        
-        return results
+        except Exception as e:
+            log.error(f"技能执行失败: {name}, 错误: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
     
     async def simple_respond(self, user_input: str) -> str:
         """
@@ -273,15 +660,30 @@ class ReActPlanner:
         """
         self.memory.add_message("user", user_input)
         
+        system_prompt = self.brain.get_system_prompt()
+        
+        # 语义缓存：不带工具的纯对话才可以复用历史回复
+        # 回复依赖记忆上下文，使用独立作用域，不与 LLMBrain.simple_chat 的条目互相命中
+        semantic_cache = self.brain.semantic_cache
+        scope = f"simple_respond:{system_prompt}"
+        if semantic_cache is not None:
+            cached = await semantic_cache.lookup(user_input, scope=scope)
+            if cached is not None:
+                self.memory.add_message("assistant", cached)
+                return cached
+        
         messages = self.memory.get_context_with_memory(user_input)
         messages.insert(0, {
             "role": "system",
-            "content": self.brain.get_system_prompt()
+            "content": system_prompt
         })
         
         response = await self.brain.chat(messages)
         reply = response.get("content", "")
         
+        if semantic_cache is not None:
+            await semantic_cache.store(user_input, reply, scope=scope)
+        
         self.memory.add_message("assistant", reply)
         
         return reply
@@ -0,0 +1,191 @@
+"""
+JARVIS 语义缓存模块
+对近似重复的用户提问直接返回历史回复，跳过 LLM 请求
+
+Author: gngdingghuan
+"""
+
+import asyncio
+import importlib.util
+from typing import Any, List, Optional
+
+from utils.logger import log
+
+# 依赖体积较大，这里只检查是否安装，实际导入延迟到 _load_model
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+# 句向量模型
+SENTENCE_TRANSFORMERS_AVAILABLE = (
+    NUMPY_AVAILABLE and importlib.util.find_spec("sentence_transformers") is not None
+)
+
+# FAISS 向量索引（不可用时退化为 numpy 矩阵检索）
+FAISS_AVAILABLE = importlib.util.find_spec("faiss") is not None
+
+
+class SemanticCache:
+    """
+    语义缓存
+    - 本地句向量模型编码用户提问（无需网络嵌入请求）
+    - 归一化向量 + 内积检索，相似度超过阈值即命中
+    - 只用于不带工具的纯对话，工具调用有副作用，不能复用
+    """
+
+    def __init__(
+        self,
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        threshold: float = 0.92,
+        max_entries: int = 1000,
+    ):
+        """
+        初始化语义缓存
+
+        Args:
+            model_name: sentence-transformers 模型名称
+            threshold: 命中所需的最低余弦相似度
+            max_entries: 最大缓存条目数，写满后淘汰最早的条目
+        """
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self._model = None
+        self._np = None
+        self._faiss = None
+        self._index = None
+        self._vectors: Optional[Any] = None
+        self._responses: List[str] = []
+        self._scopes: List[str] = []
+        self._lock = asyncio.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            log.warning("sentence-transformers 未安装，语义缓存不可用")
+
+    @property
+    def is_ready(self) -> bool:
+        """模型是否已加载"""
+        return self._model is not None
+
+    async def warm_up(self):
+        """在后台线程加载模型，避免阻塞事件循环"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE or self.is_ready:
+            return
+        await asyncio.to_thread(self._load_model)
+
+    def _load_model(self):
+        """加载句向量模型"""
+        try:
+            import numpy as np
+            from sentence_transformers import SentenceTransformer
+
+            self._np = np
+            if FAISS_AVAILABLE:
+                import faiss
+                self._faiss = faiss
+
+            log.info(f"正在加载语义缓存模型: {self.model_name}...")
+            model = SentenceTransformer(self.model_name)
+            self._reset_index(model.get_sentence_embedding_dimension())
+            self._model = model
+            log.info("语义缓存模型加载完成")
+
+        except Exception as e:
+            log.error(f"语义缓存模型加载失败: {e}")
+            self._model = None
+
+    def _reset_index(self, dim: int):
+        """重建空索引"""
+        if self._faiss is not None:
+            self._index = self._faiss.IndexFlatIP(dim)
+        else:
+            self._vectors = self._np.empty((0, dim), dtype=self._np.float32)
+        self._responses = []
+        self._scopes = []
+
+    def _evict_oldest(self, n: int):
+        """淘汰最早写入的 n 条（FAISS 平坦索引删除后会顺移编号，与列表下标保持一致）"""
+        if self._faiss is not None:
+            self._index.remove_ids(self._np.arange(n, dtype=self._np.int64))
+        else:
+            self._vectors = self._vectors[n:]
+        del self._responses[:n]
+        del self._scopes[:n]
+
+    def _embed(self, text: str):
+        """编码为归一化向量 (1, dim)"""
+        vec = self._model.encode([text], normalize_embeddings=True)
+        return self._np.asarray(vec, dtype=self._np.float32)
+
+    def _search(self, vec):
+        """检索最相似的一条，返回 (score, index)"""
+        if not self._responses:
+            return 0.0, -1
+
+        if self._faiss is not None:
+            scores, ids = self._index.search(vec, 1)
+            return float(scores[0][0]), int(ids[0][0])
+
+        scores = self._vectors @ vec[0]
+        idx = int(self._np.argmax(scores))
+        return float(scores[idx]), idx
+
+    async def lookup(self, query: str, scope: str = "") -> Optional[str]:
+        """
+        查找语义相近的历史回复
+
+        Args:
+            query: 用户提问
+            scope: 作用域（如系统提示词），不同作用域的条目互不命中
+
+        Returns:
+            命中的回复，未命中返回 None
+        """
+        if not self.is_ready or not query.strip():
+            return None
+
+        vec = await asyncio.to_thread(self._embed, query)
+
+        async with self._lock:
+            score, idx = self._search(vec)
+            if idx >= 0 and score > self.threshold and self._scopes[idx] == scope:
+                self.hits += 1
+                log.debug(f"语义缓存命中，相似度 {score:.3f}")
+                return self._responses[idx]
+
+        self.misses += 1
+        return None
+
+    async def store(self, query: str, response: str, scope: str = ""):
+        """
+        保存提问与回复
+
+        Args:
+            query: 用户提问
+            response: LLM 回复
+            scope: 作用域
+        """
+        if not self.is_ready or not query.strip() or not response:
+            return
+
+        vec = await asyncio.to_thread(self._embed, query)
+
+        async with self._lock:
+            if len(self._responses) >= self.max_entries:
+                self._evict_oldest(len(self._responses) - self.max_entries + 1)
+
+            if self._faiss is not None:
+                self._index.add(vec)
+            else:
+                self._vectors = self._np.vstack([self._vectors, vec])
+            self._responses.append(response)
+            self._scopes.append(scope)
+
+    def clear(self):
+        """清空缓存"""
+        if self.is_ready:
+            self._reset_index(self._model.get_sentence_embedding_dimension())
+        self.hits = 0
+        self.misses = 0
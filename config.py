@@ -49,10 +49,34 @@ class LLMConfig:
     ollama_base_url: str = field(default_factory=lambda: os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
     ollama_model: str = field(default_factory=lambda: os.getenv("OLLAMA_MODEL", "llama3"))
     
+    # 将 cache_control 提示词缓存标记原样转发（仅 Anthropic 兼容端点需要）
+    forward_cache_control: bool = field(
+        default_factory=lambda: os.getenv("LLM_FORWARD_CACHE_CONTROL", "").lower() in ("1", "true", "yes")
+    )
+    
+    # 多提供商竞速（逗号分隔，如 "deepseek,openai"），每轮请求同时发出、取最快的响应
+    # 成本约 N 倍，默认关闭；流式与非流式 ReAct 循环均生效，当前提供商总会参与
+    # 这里只保存名称，由规划器解析（未知名称记录警告后忽略）
+    race_providers: List[str] = field(
+        default_factory=lambda: [
+            name.strip().lower()
+            for name in os.getenv("LLM_RACE_PROVIDERS", "").split(",")
+            if name.strip()
+        ]
+    )
+    
     # 通用配置
     temperature: float = 0.7
     max_tokens: int = 4096
     stream: bool = True
+    
+    # 模型上下文窗口（token），超出预算时裁剪历史消息
+    context_window: int = field(default_factory=lambda: int(os.getenv("LLM_CONTEXT_WINDOW", "64000")))
+    
+    @property
+    def max_tokens_budget(self) -> int:
+        """单次请求输入部分的 token 预算（为回复和估算误差预留空间）"""
+        return self.context_window - self.max_tokens - 512
 
 
 @dataclass
@@ -128,6 +152,25 @@ class MemoryConfig:
     embedding_model: str = "text-embedding-3-small"
 
 
+@dataclass
+class CacheConfig:
+    """缓存配置"""
+    # LLM 响应缓存（仅 temperature == 0 的确定性请求会被缓存）
+    response_cache_enabled: bool = True
+    response_cache_size: int = 1000
+    response_cache_ttl: int = 3600  # 秒
+    
+    # SQLite 持久化路径，默认只使用内存缓存（持久化会把 LLM 回复写入磁盘，需显式开启）
+    response_cache_db: Optional[str] = field(default_factory=lambda: os.getenv("LLM_RESPONSE_CACHE_DB") or None)
+    
+    # 语义缓存（近似重复提问直接返回历史回复，仅用于不带工具的 simple_chat）
+    # 默认关闭：主流程走 ReAct 规划器，不会用到它，开启后启动时会加载句向量模型
+    semantic_cache_enabled: bool = False
+    semantic_cache_model: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_size: int = 1000
+
+
 @dataclass
 class ServerConfig:
     """服务器配置"""
@@ -152,9 +195,14 @@ class JarvisConfig:
     voice: VoiceConfig = field(default_factory=VoiceConfig)
     security: SecurityConfig = field(default_factory=SecurityConfig)
     memory: MemoryConfig = field(default_factory=MemoryConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
     server: ServerConfig = field(default_factory=ServerConfig)
     iot: IoTConfig = field(default_factory=IoTConfig)
     
+    # ReAct 循环配置
+    react_max_iterations: int = 10  # 最大循环次数，防止无限循环
+    react_repeat_break: int = 2  # 同一工具调用（名称 + 参数）重复达到该次数时提前结束
+    
     # 日志配置
     log_level: str = "INFO"
     log_file: str = field(default_factory=lambda: str(Path.home() / ".jarvis" / "jarvis.log"))
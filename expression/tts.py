@@ -6,10 +6,11 @@ Author: gngdingghuan
 """
 
 import asyncio
+import re
 import tempfile
 import os
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional
 
 from config import get_config
 from utils.logger import log
@@ -29,6 +30,21 @@ try:
 except:
     PYGAME_AVAILABLE = False
 
+# 句末标点，流式播放按句切分
+_SENTENCE_RE = re.compile(r'[^。！？.!?\n]*[。！？.!?\n]')
+
+
+def _split_sentences(text: str):
+    """
+    切分出完整的句子
+    
+    Returns:
+        (完整句子列表, 剩余未结束的文本)
+    """
+    sentences = _SENTENCE_RE.findall(text)
+    consumed = sum(len(sentence) for sentence in sentences)
+    return [sentence for sentence in sentences if sentence.strip()], text[consumed:]
+
 
 class TTS:
     """
@@ -142,47 +158,60 @@ class TTS:
         except Exception as e:
             log.error(f"音频播放失败: {e}")
     
-    async def speak_stream(self, text_generator) -> bool:
+    async def speak_stream(
+        self,
+        text_generator: AsyncIterator[str],
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> bool:
         """
         流式语音播放
         边生成文本边播放（用于 LLM 流式输出）
+        按句末标点切分，经队列交给单个播放任务，生成与播放互不阻塞且保证顺序
         
         Args:
             text_generator: 文本生成器
+            on_chunk: 每个文本片段到达时的回调（如同步打印到终端）
             
         Returns:
             是否成功
         """
-        if not EDGE_TTS_AVAILABLE or not PYGAME_AVAILABLE:
-            return False
+        available = EDGE_TTS_AVAILABLE and PYGAME_AVAILABLE
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def _consume():
+            while True:
+                sentence = await queue.get()
+                if sentence is None:
+                    break
+                await self.speak(sentence)
         
-        buffer = ""
-        sentence_endings = ("。", "！", "？", ".", "!", "?", "\n")
+        consumer = asyncio.create_task(_consume()) if available else None
+        pending = ""
         
         try:
             async for chunk in text_generator:
-                buffer += chunk
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                if consumer is None:
+                    continue
                 
-                # 检查是否有完整句子
-                for ending in sentence_endings:
-                    if ending in buffer:
-                        idx = buffer.rfind(ending)
-                        sentence = buffer[:idx + 1]
-                        buffer = buffer[idx + 1:]
-                        
-                        # 播放句子
-                        await self.speak(sentence.strip())
-                        break
+                sentences, pending = _split_sentences(pending + chunk)
+                for sentence in sentences:
+                    queue.put_nowait(sentence)
             
             # 播放剩余内容
-            if buffer.strip():
-                await self.speak(buffer.strip())
+            if consumer is not None and pending.strip():
+                queue.put_nowait(pending)
             
-            return True
+            return available
             
         except Exception as e:
             log.error(f"流式 TTS 失败: {e}")
             return False
+        finally:
+            if consumer is not None:
+                queue.put_nowait(None)
+                await consumer
     
     def stop(self):
         """停止播放"""
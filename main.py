@@ -10,8 +10,11 @@ Author: gngdingghuan
 """
 
 import asyncio
+import re
 import sys
+import time
 from pathlib import Path
+from typing import AsyncGenerator, Optional
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, str(Path(__file__).parent))
@@ -19,6 +22,14 @@ sys.path.insert(0, str(Path(__file__).parent))
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
+from rich.live import Live
+
+try:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.formatted_text import HTML
+    PROMPT_TOOLKIT_AVAILABLE = True
+except ImportError:
+    PROMPT_TOOLKIT_AVAILABLE = False
 
 from config import get_config, LLMProvider
 from utils.logger import log
@@ -26,17 +37,38 @@ from cognitive.llm_brain import LLMBrain
 from cognitive.memory import MemoryManager
 from cognitive.context_manager import ContextManager
 from cognitive.planner import ReActPlanner
-from skills.system_control import SystemControlSkill
-from skills.file_manager import FileManagerSkill
-from skills.web_browser import WebBrowserSkill
-from skills.terminal import TerminalSkill
-from skills.iot_bridge import IoTBridgeSkill
+from skills.lazy_skill import LazySkill
 from expression.tts import TTS
 from security.confirmation import get_confirmation_handler
 
 
 console = Console()
 
+# 退出命令：命令行整句匹配，语音模式包含即退出
+_EXIT_SET = frozenset({'exit', 'quit', 'bye', '退出', '再见'})
+_EXIT_RE = re.compile(r'退出|再见|关闭|exit|quit|bye', re.IGNORECASE)
+
+# 流式输出的刷新频率，Markdown 重新渲染不超过每个刷新周期一次
+_LIVE_REFRESH_PER_SECOND = 12
+
+# 命令行输入会话（首次读取输入时创建，非交互环境导入本模块不会触发终端检测）
+_SESSION: Optional["PromptSession"] = None
+
+
+async def _prompt(message) -> str:
+    """
+    异步读取一行输入
+    prompt_toolkit 在事件循环内等待输入，不占用线程池；不可用时退化为线程中的 input()
+    """
+    global _SESSION
+    
+    if not PROMPT_TOOLKIT_AVAILABLE:
+        return await asyncio.to_thread(input, str(message))
+    
+    if _SESSION is None:
+        _SESSION = PromptSession()
+    return await _SESSION.prompt_async(message)
+
 
 class Jarvis:
     """
@@ -75,44 +107,68 @@ class Jarvis:
         # 设置确认回调
         self.planner.set_confirmation_callback(self._handle_confirmation)
         
+        # 后台任务（保留引用，防止被垃圾回收）
+        self._background_tasks: set = set()
+        
+        # 正在进行的流式输出，确认提示时需要暂停
+        self._live: Optional[Live] = None
+        
         console.print("[green]✓ JARVIS 初始化完成[/green]")
     
     def _init_skills(self) -> dict:
-        """初始化所有技能"""
-        skills = {}
-        
-        # 系统控制
-        system_skill = SystemControlSkill()
-        skills["system_control"] = system_skill
-        
-        # 文件管理
-        file_skill = FileManagerSkill()
-        skills["file_manager"] = file_skill
-        
-        # 网页浏览
-        web_skill = WebBrowserSkill()
-        skills["web_browser"] = web_skill
-        
-        # 终端命令
-        terminal_skill = TerminalSkill()
-        skills["terminal"] = terminal_skill
+        """初始化所有技能（懒加载，首次使用时才导入和实例化）"""
+        factories = {
+            "system_control": ("skills.system_control", "SystemControlSkill"),  # 系统控制
+            "file_manager": ("skills.file_manager", "FileManagerSkill"),        # 文件管理
+            "web_browser": ("skills.web_browser", "WebBrowserSkill"),           # 网页浏览
+            "terminal": ("skills.terminal", "TerminalSkill"),                   # 终端命令
+        }
         
         # IoT 控制（如果配置了）
         if self.config.iot.enabled:
-            iot_skill = IoTBridgeSkill()
-            skills["iot_bridge"] = iot_skill
+            factories["iot_bridge"] = ("skills.iot_bridge", "IoTBridgeSkill")
+        
+        skills = {
+            name: LazySkill(module_path, class_name)
+            for name, (module_path, class_name) in factories.items()
+        }
         
-        console.print(f"[dim]已加载 {len(skills)} 个技能[/dim]")
+        console.print(f"[dim]已注册 {len(skills)} 个技能[/dim]")
         
         return skills
     
+    def _start_background_tasks(self):
+        """启动后台预热任务（连接预热、模型加载），不阻塞初始化"""
+        task = asyncio.create_task(self.brain.warm_up())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def shutdown(self):
+        """退出前释放资源"""
+        for task in self._background_tasks:
+            task.cancel()
+        await self.brain.aclose()
+        
+        # 网页技能按需加载，未加载过就没有需要关闭的客户端
+        web_browser = sys.modules.get("skills.web_browser")
+        if web_browser is not None:
+            await web_browser.close_web_client()
+    
     async def _handle_confirmation(self, message: str) -> bool:
         """处理确认请求"""
-        console.print(f"\n[yellow]⚠️  {message}[/yellow]")
-        console.print("[dim]输入 y 确认，n 拒绝:[/dim]", end=" ")
-        
-        # 使用异步输入
-        user_input = await asyncio.to_thread(input)
+        # 暂停流式输出，避免与确认提示互相覆盖
+        live = self._live
+        if live is not None:
+            live.stop()
+        
+        try:
+            console.print(f"\n[yellow]⚠️  {message}[/yellow]")
+            console.print("[dim]输入 y 确认，n 拒绝:[/dim]")
+            
+            user_input = await _prompt("[y/N] ")
+        finally:
+            if live is not None:
+                live.start()
         
         return user_input.strip().lower() in ['y', 'yes', '是', '确认']
     
@@ -137,25 +193,46 @@ class Jarvis:
         
         return response
     
+    async def process_stream(self, user_input: str) -> AsyncGenerator[str, None]:
+        """
+        处理用户输入（流式）
+        
+        Args:
+            user_input: 用户输入文本
+            
+        Yields:
+            AI 回复文本片段
+        """
+        self.context.set_current_task(user_input[:50])
+        
+        try:
+            async for chunk in self.planner.plan_and_execute_stream(user_input):
+                yield chunk
+        finally:
+            self.context.clear_current_task()
+    
     async def speak(self, text: str):
         """语音输出"""
         await self.tts.speak(text)
     
     async def run_cli(self):
         """运行命令行交互模式"""
+        self._start_background_tasks()
         self._print_welcome()
         
         while True:
             try:
                 # 获取用户输入
-                console.print("\n[bold cyan]You:[/bold cyan] ", end="")
-                user_input = await asyncio.to_thread(input)
+                console.print()
+                user_input = await _prompt(
+                    HTML("<ansicyan><b>You:</b></ansicyan> ") if PROMPT_TOOLKIT_AVAILABLE else "You: "
+                )
                 
                 if not user_input.strip():
                     continue
                 
                 # 退出命令
-                if user_input.strip().lower() in ['exit', 'quit', '退出', 'bye']:
+                if user_input.strip().lower() in _EXIT_SET:
                     console.print("\n[cyan]JARVIS: 再见，Sir。[/cyan]")
                     break
                 
@@ -164,15 +241,26 @@ class Jarvis:
                     await self._handle_command(user_input)
                     continue
                 
-                # 处理请求
-                console.print("\n[bold green]JARVIS:[/bold green] ", end="")
+                # 处理请求，边生成边渲染
+                console.print("\n[bold green]JARVIS:[/bold green]")
                 
-                response = await self.process(user_input)
+                buffer = ""
+                rendered_at = 0.0
+                with Live(Markdown(""), console=console, refresh_per_second=_LIVE_REFRESH_PER_SECOND) as live:
+                    self._live = live
+                    try:
+                        async for chunk in self.process_stream(user_input):
+                            buffer += chunk
+                            now = time.monotonic()
+                            if now - rendered_at >= 1 / _LIVE_REFRESH_PER_SECOND:
+                                live.update(Markdown(buffer))
+                                rendered_at = now
+                    finally:
+                        # 补上最后一个刷新周期内的内容
+                        live.update(Markdown(buffer))
+                        self._live = None
                 
-                # 输出回复
-                console.print(Markdown(response))
-                
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 console.print("\n\n[cyan]JARVIS: 收到中断信号，再见。[/cyan]")
                 break
             except Exception as e:
@@ -189,6 +277,7 @@ class Jarvis:
             console.print("[red]语音识别不可用，请检查依赖安装[/red]")
             return
         
+        self._start_background_tasks()
         self._print_welcome()
         console.print("[cyan]语音模式已启动，请说话...[/cyan]\n")
         
@@ -205,17 +294,17 @@ class Jarvis:
                 console.print(f"\n[bold cyan]You:[/bold cyan] {text}")
                 
                 # 退出命令
-                if any(word in text for word in ['退出', '再见', '关闭']):
+                if _EXIT_RE.search(text):
                     await self.speak("再见，Sir。")
                     break
                 
-                # 处理请求
-                response = await self.process(text)
-                
-                console.print(f"\n[bold green]JARVIS:[/bold green] {response}")
-                
-                # 语音输出
-                await self.speak(response)
+                # 处理请求，首句生成后即开始播报
+                console.print("\n[bold green]JARVIS:[/bold green] ", end="")
+                await self.tts.speak_stream(
+                    self.process_stream(text),
+                    on_chunk=lambda chunk: console.print(chunk, end="", markup=False, highlight=False),
+                )
+                console.print()
                 
             except KeyboardInterrupt:
                 await self.speak("收到中断信号，再见。")
@@ -286,6 +375,7 @@ class Jarvis:
     def _print_status(self):
         """打印系统状态"""
         memory_stats = self.memory.get_stats()
+        cache_stats = self.brain.get_cache_stats()
         context = self.context.get_system_state()
         
         status = f"""
@@ -294,6 +384,7 @@ class Jarvis:
 - **LLM 提供商**: {self.brain.provider.value}
 - **短期记忆**: {memory_stats['short_term_count']} 条
 - **长期记忆**: {memory_stats['long_term_count']} 条
+- **LLM 缓存**: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次
 - **活跃窗口**: {context.get('active_window', 'N/A')}
 - **CPU 使用率**: {context.get('cpu_percent', 0):.1f}%
 - **内存使用率**: {context.get('memory_percent', 0):.1f}%
@@ -327,10 +418,13 @@ async def main():
     jarvis = Jarvis()
     
     # 运行
-    if args.voice:
-        await jarvis.run_voice()
-    else:
-        await jarvis.run_cli()
+    try:
+        if args.voice:
+            await jarvis.run_voice()
+        else:
+            await jarvis.run_cli()
+    finally:
+        await jarvis.shutdown()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,27 @@
 """
 JARVIS 技能层模块
+技能类按需导入，避免 import skills 时加载 pyautogui、httpx 等重量级依赖
 
 Author: gngdingghuan
 """
 
-from skills.base_skill import BaseSkill, SkillResult
-from skills.system_control import SystemControlSkill
-from skills.file_manager import FileManagerSkill
-from skills.web_browser import WebBrowserSkill
-from skills.terminal import TerminalSkill
+import importlib
 
-__all__ = [
-    "BaseSkill",
-    "SkillResult",
-    "SystemControlSkill",
-    "FileManagerSkill",
-    "WebBrowserSkill",
-    "TerminalSkill",
-]
+# 导出名称 -> 所在模块
+_EXPORTS = {
+    "BaseSkill": "skills.base_skill",
+    "SkillResult": "skills.base_skill",
+    "LazySkill": "skills.lazy_skill",
+    "SystemControlSkill": "skills.system_control",
+    "FileManagerSkill": "skills.file_manager",
+    "WebBrowserSkill": "skills.web_browser",
+    "TerminalSkill": "skills.terminal",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module 'skills' has no attribute {name!r}")
@@ -18,7 +18,7 @@ class PermissionLevel(Enum):
     CRITICAL = 3       # 危险操作，需要确认
 
 
-@dataclass
+@dataclass(slots=True)
 class SkillResult:
     """技能执行结果"""
     success: bool
@@ -44,6 +44,12 @@ class BaseSkill(ABC):
     description: str = "基础技能"
     permission_level: PermissionLevel = PermissionLevel.READ_ONLY
     
+    # 为 True 时同一轮的工具调用按顺序执行（调用之间存在依赖）
+    sequential: bool = False
+    
+    # 为 True 时同一轮中完全相同的调用只执行一次（有副作用的技能应设为 False）
+    idempotent: bool = True
+    
     def __init__(self):
         pass
     
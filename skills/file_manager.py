@@ -22,6 +22,8 @@ class FileManagerSkill(BaseSkill):
     name = "file_manager"
     description = "文件管理：读取、创建、移动、删除文件和目录"
     permission_level = PermissionLevel.SAFE_WRITE
+    sequential = True  # 同一轮的文件操作常有先后依赖（先建目录再写文件）
+    idempotent = False  # 写入、追加等操作重复调用各自执行
     
     def __init__(self):
         super().__init__()
@@ -20,6 +20,7 @@ class IoTBridgeSkill(BaseSkill):
     name = "iot_bridge"
     description = "智能家居控制：获取设备列表、控制设备"
     permission_level = PermissionLevel.SAFE_WRITE
+    idempotent = False  # 开关类操作（toggle）重复执行结果不同
     
     def __init__(self):
         super().__init__()
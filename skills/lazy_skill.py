@@ -0,0 +1,68 @@
+"""
+JARVIS 技能懒加载
+首次使用时才导入技能模块并实例化，加快启动速度
+
+Author: gngdingghuan
+"""
+
+import importlib
+from typing import Any, Dict
+
+from utils.logger import log
+
+
+class LazySkill:
+    """
+    技能懒加载代理
+    访问 get_schema / description / needs_confirmation / execute 等任意属性时，
+    才导入模块并创建真正的技能实例
+    """
+    
+    def __init__(self, module_path: str, class_name: str):
+        """
+        初始化代理
+        
+        Args:
+            module_path: 技能模块路径，如 "skills.web_browser"
+            class_name: 技能类名，如 "WebBrowserSkill"
+        """
+        self._module_path = module_path
+        self._class_name = class_name
+        self._instance = None
+    
+    @property
+    def is_loaded(self) -> bool:
+        """技能是否已实例化"""
+        return self._instance is not None
+    
+    @property
+    def instance(self) -> Any:
+        """获取技能实例（首次访问时导入并创建）"""
+        if self._instance is None:
+            module = importlib.import_module(self._module_path)
+            skill_class = getattr(module, self._class_name)
+            self._instance = skill_class()
+            log.debug(f"已加载技能: {self._class_name}")
+        return self._instance
+    
+    def get_schema(self) -> Dict[str, Any]:
+        """获取 Function Calling Schema"""
+        return self.instance.get_schema()
+    
+    def needs_confirmation(self, params: Dict[str, Any]) -> bool:
+        """检查是否需要用户确认"""
+        return self.instance.needs_confirmation(params)
+    
+    async def execute(self, **params) -> Any:
+        """执行技能"""
+        return await self.instance.execute(**params)
+    
+    def __getattr__(self, name: str) -> Any:
+        # 仅在常规属性查找失败时调用（description、sequential 等）
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+    
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded else "lazy"
+        return f"<LazySkill: {self._class_name} ({state})>"
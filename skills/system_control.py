@@ -27,6 +27,8 @@ class SystemControlSkill(BaseSkill):
     name = "system_control"
     description = "系统控制：打开应用、调节音量、键鼠操作"
     permission_level = PermissionLevel.SAFE_WRITE
+    sequential = True  # 键鼠操作（输入文本、按键、点击）必须按顺序执行
+    idempotent = False  # 连续两次相同的按键、点击是有意为之
     
     # Windows 常用应用映射
     WINDOWS_APPS = {
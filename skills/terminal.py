@@ -5,15 +5,126 @@ JARVIS 终端命令技能
 Author: gngdingghuan
 """
 
+import os
+import time
+import shlex
 import asyncio
 import subprocess
-from typing import Dict, Any, Optional, List
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple
 
 from skills.base_skill import BaseSkill, SkillResult, PermissionLevel, create_tool_schema
 from config import get_config
 from utils.logger import log
 from utils.platform_utils import is_windows, get_shell
 
+# Aho-Corasick 多模式匹配（不可用时逐个关键词查找）
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# 每个输出流最多保留的字节数，超出后丢弃较早的输出（只保留末尾）
+MAX_OUTPUT_BYTES = 32 * 1024
+
+# 单次读取的字节数
+READ_CHUNK_SIZE = 4096
+
+# 返回给 LLM 的最大输出字符数
+MAX_OUTPUT_CHARS = 5000
+
+# shell 元字符（管道、重定向、变量、通配符、子命令等），出现时必须交给 shell 执行
+# 引号不在其中：shlex 按 shell 规则处理引号
+_SHELL_META = frozenset(";|&$<>*?`~(){}[]!#\\\n")
+
+async def _read_tail(stream: asyncio.StreamReader, limit: int = MAX_OUTPUT_BYTES) -> Tuple[bytes, bool]:
+    """
+    增量读取输出流，内存中只保留最后约 limit 字节
+    
+    Returns:
+        (保留的输出, 是否丢弃过较早的输出)
+    """
+    chunks = deque()
+    size = 0
+    truncated = False
+    
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        
+        chunks.append(chunk)
+        size += len(chunk)
+        
+        while size > limit and len(chunks) > 1:
+            size -= len(chunks.popleft())
+            truncated = True
+    
+    return b"".join(chunks), truncated
+
+
+def _decode_tail(data: bytes, truncated: bool) -> str:
+    """
+    解码输出末尾的 MAX_OUTPUT_CHARS 个字符
+    UTF-8 每个字符最多 4 字节，只需解码最后 MAX_OUTPUT_CHARS * 4 字节
+    """
+    max_bytes = MAX_OUTPUT_CHARS * 4
+    if len(data) > max_bytes:
+        data = data[-max_bytes:]
+        truncated = True
+    
+    # 命令输出的开头很少有空白，只去掉末尾的换行
+    text = data.decode('utf-8', errors='replace').rstrip()
+    
+    # 限制输出长度（保留末尾，与读取时的截断方向一致）
+    if truncated or len(text) > MAX_OUTPUT_CHARS:
+        text = "...(输出已截断)\n" + text[-MAX_OUTPUT_CHARS:]
+    
+    return text
+
+
+@dataclass(slots=True)
+class _CmdInfo:
+    """规范化后的命令（每个命令只解析一次，在确认和执行之间传递）"""
+    raw: str    # 原始命令
+    lower: str  # 小写并去除首尾空白
+    first: str  # 首词（小写）
+    
+    @classmethod
+    def _parse(cls, command: str) -> "_CmdInfo":
+        """解析命令"""
+        lower = command.lower().strip()
+        return cls(raw=command, lower=lower, first=lower.partition(' ')[0])
+
+
+# Function Calling Schema（静态内容，模块加载时构建一次）
+_TERMINAL_SCHEMA = create_tool_schema(
+    name="terminal",
+    description="执行终端命令。危险命令会被拒绝，需要用户确认才能执行",
+    parameters={
+        "action": {
+            "type": "string",
+            "enum": ["run_command", "run_safe_command"],
+            "description": "操作类型：run_command 需要确认，run_safe_command 仅执行只读命令"
+        },
+        "command": {
+            "type": "string",
+            "description": "要执行的命令"
+        },
+        "cwd": {
+            "type": "string",
+            "description": "工作目录（可选）"
+        },
+        "timeout": {
+            "type": "integer",
+            "description": "超时时间（秒）"
+        }
+    },
+    required=["action", "command"]
+)
+
 
 class TerminalSkill(BaseSkill):
     """终端命令执行技能"""
@@ -21,45 +132,76 @@ class TerminalSkill(BaseSkill):
     name = "terminal"
     description = "执行终端命令（受安全限制）"
     permission_level = PermissionLevel.CRITICAL  # 危险操作，需要确认
+    sequential = True  # 同一轮的命令常有先后依赖（先 cd/mkdir 再执行），不能并发
+    idempotent = False  # 命令可能有副作用，重复调用各自执行
     
     def __init__(self):
         super().__init__()
         self.security_config = get_config().security
         self._shell = get_shell()
-    
-    def _is_command_safe(self, command: str) -> bool:
-        """检查命令是否安全"""
-        command_lower = command.lower().strip()
         
-        # 检查禁止的命令
-        for forbidden in self.security_config.forbidden_commands:
-            if forbidden.lower() in command_lower:
-                return False
+        # 禁止关键词：构建一次自动机，一次扫描即可匹配全部关键词
+        self._forbidden_lower = tuple(f.lower() for f in self.security_config.forbidden_commands)
+        self._forbidden_ac = None
+        if AHOCORASICK_AVAILABLE and self._forbidden_lower:
+            automaton = ahocorasick.Automaton()
+            for keyword in self._forbidden_lower:
+                automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._forbidden_ac = automaton
         
-        return True
+        # 安全命令：单词命令按首词查集合；多词命令（如 "pip list"）整句相等或以 "前缀 + 空格" 开头
+        safe_lower = [" ".join(c.lower().split()) for c in self.security_config.safe_commands if c.strip()]
+        self._safe_first_words = frozenset(c for c in safe_lower if " " not in c)
+        self._safe_exact = frozenset(c for c in safe_lower if " " in c)
+        self._safe_prefixes = tuple(c + " " for c in self._safe_exact)
+        self._safe_prefix_first_words = frozenset(c.partition(" ")[0] for c in self._safe_exact)
+        
+        # 可以在进程内直接回答的简单命令（仅在不含 shell 元字符时使用）
+        self._builtins = {
+            "pwd": self._builtin_pwd,
+            "whoami": self._builtin_whoami,
+            "date": self._builtin_date,
+            "echo": self._builtin_echo,
+        }
+        
+        # 最近一次解析的命令：规划器先调用 needs_confirmation 再调用 execute，同一命令只解析一次
+        self._last_cmd: Optional[_CmdInfo] = None
     
-    def _is_command_readonly(self, command: str) -> bool:
-        """检查命令是否为只读命令"""
-        command_lower = command.lower().strip()
+    def _parse_command(self, command: str) -> _CmdInfo:
+        """解析命令（复用最近一次的解析结果）"""
+        cmd = self._last_cmd
+        if cmd is None or cmd.raw != command:
+            cmd = self._last_cmd = _CmdInfo._parse(command)
+        return cmd
+    
+    def _is_forbidden(self, cmd: _CmdInfo) -> bool:
+        """检查命令是否包含禁止的关键词"""
+        if self._forbidden_ac is not None:
+            return next(self._forbidden_ac.iter(cmd.lower), None) is not None
         
-        # 获取命令的第一个词
-        first_word = command_lower.split()[0] if command_lower.split() else ""
+        return any(forbidden in cmd.lower for forbidden in self._forbidden_lower)
+    
+    def _is_readonly(self, cmd: _CmdInfo) -> bool:
+        """检查命令是否为只读命令"""
+        first = cmd.first
+        if not first:
+            return False
         
-        # 检查是否在安全命令列表中
-        for safe_cmd in self.security_config.safe_commands:
-            if command_lower.startswith(safe_cmd.lower()):
-                return True
-            if first_word == safe_cmd.lower().split()[0]:
-                return True
+        if first in self._safe_first_words:
+            return True
         
-        return False
+        # 多词安全命令需要完整匹配前缀（"python --version" 不放行 "python script.py"）
+        if first not in self._safe_prefix_first_words:
+            return False
+        return cmd.lower in self._safe_exact or cmd.lower.startswith(self._safe_prefixes)
     
     def needs_confirmation(self, params: Dict[str, Any]) -> bool:
         """检查是否需要确认"""
         command = params.get("command", "")
         
         # 只读命令不需要确认
-        if self._is_command_readonly(command):
+        if self._is_readonly(self._parse_command(command)):
             return False
         
         # 其他命令需要确认
@@ -75,6 +217,10 @@ class TerminalSkill(BaseSkill):
         if action not in actions:
             return SkillResult(success=False, output=None, error=f"未知的操作: {action}")
         
+        # 命令在分发前解析一次
+        if isinstance(params.get("command"), str):
+            params["command"] = self._parse_command(params["command"])
+        
         try:
             result = await actions[action](**params)
             return result
@@ -84,44 +230,159 @@ class TerminalSkill(BaseSkill):
     
     async def _run_command(
         self,
-        command: str,
+        command: _CmdInfo,
         cwd: Optional[str] = None,
         timeout: int = 30
     ) -> SkillResult:
         """执行命令"""
+        return await self._run_checked(command, cwd, timeout)
+    
+    @staticmethod
+    def _exec_argv(command: str) -> Optional[List[str]]:
+        """
+        不含 shell 元字符的命令拆分为参数列表，可以不经 shell 直接执行
+        Windows 的 dir、type 等是 cmd 内建命令，始终交给 shell
+        """
+        if is_windows() or not _SHELL_META.isdisjoint(command):
+            return None
+        
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            # 引号不配对，交给 shell 报错
+            return None
+        
+        return argv or None
+    
+    @staticmethod
+    def _builtin_pwd(args: List[str], cwd: Optional[str]) -> Optional[str]:
+        """pwd：返回工作目录"""
+        if args:
+            return None
+        return os.path.abspath(cwd) if cwd else os.getcwd()
+    
+    @staticmethod
+    def _builtin_whoami(args: List[str], cwd: Optional[str]) -> Optional[str]:
+        """whoami：返回当前有效用户名"""
+        if args:
+            return None
+        
+        import pwd
+        return pwd.getpwuid(os.geteuid()).pw_name
+    
+    @staticmethod
+    def _builtin_date(args: List[str], cwd: Optional[str]) -> Optional[str]:
+        """date：返回当前时间（与 date 默认格式一致）"""
+        if args:
+            return None
+        return time.strftime("%a %b %e %H:%M:%S %Z %Y")
+    
+    @staticmethod
+    def _builtin_echo(args: List[str], cwd: Optional[str]) -> Optional[str]:
+        """echo：原样输出参数（带 -n、-e 等选项时交给真正的 echo）"""
+        if args and args[0].startswith("-"):
+            return None
+        return " ".join(args)
+    
+    def _run_builtin(self, cmd: _CmdInfo, cwd: Optional[str], argv: Optional[List[str]]) -> Optional[SkillResult]:
+        """
+        在进程内执行简单命令，省去创建子进程
+        
+        Returns:
+            执行结果；无法在进程内等价执行时返回 None
+        """
+        if cmd.first not in self._builtins:
+            return None
+        
+        if argv is None:
+            argv = self._exec_argv(cmd.raw)
+        if argv is None or argv[0] not in self._builtins:
+            return None
+        
+        # 工作目录无效时交给子进程报错
+        if cwd and not os.path.isdir(cwd):
+            return None
+        
+        stdout = self._builtins[argv[0]](argv[1:], cwd)
+        if stdout is None:
+            return None
+        
+        log.info(f"执行命令（进程内）: {cmd.raw}")
+        return SkillResult(
+            success=True,
+            output={
+                "returncode": 0,
+                "stdout": stdout,
+                "stderr": ""
+            }
+        )
+    
+    async def _spawn(self, command: str, cwd: Optional[str], argv: Optional[List[str]] = None):
+        """启动子进程：给定 argv 时直接 exec，否则经由 shell"""
+        if argv is not None:
+            try:
+                return await asyncio.create_subprocess_exec(
+                    *argv,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=cwd,
+                )
+            except FileNotFoundError:
+                # shell 内建命令（cd、time 等）没有对应的可执行文件
+                pass
+        
+        # 根据平台选择 shell
+        if is_windows():
+            return await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+            )
+        
+        return await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            executable="/bin/bash"
+        )
+    
+    async def _run_checked(
+        self,
+        cmd: _CmdInfo,
+        cwd: Optional[str],
+        timeout: int,
+        argv: Optional[List[str]] = None
+    ) -> SkillResult:
+        """安全检查后执行命令"""
         # 安全检查
-        if not self._is_command_safe(command):
+        if self._is_forbidden(cmd):
             return SkillResult(
                 success=False,
                 output=None,
                 error=f"命令被拒绝：包含禁止的操作"
             )
         
-        log.info(f"执行命令: {command}")
+        builtin_result = self._run_builtin(cmd, cwd, argv)
+        if builtin_result is not None:
+            return builtin_result
+        
+        log.info(f"执行命令: {cmd.raw}")
         
         try:
-            # 根据平台选择 shell
-            if is_windows():
-                process = await asyncio.create_subprocess_shell(
-                    command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd,
-                    shell=True,
-                )
-            else:
-                process = await asyncio.create_subprocess_shell(
-                    command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd,
-                    shell=True,
-                    executable="/bin/bash"
-                )
+            process = await self._spawn(cmd.raw, cwd, argv)
+            
+            # 边运行边读取输出，避免大量输出全部堆积在内存中
+            readers = asyncio.gather(
+                asyncio.create_task(_read_tail(process.stdout)),
+                asyncio.create_task(_read_tail(process.stderr)),
+                process.wait(),
+            )
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
+                (stdout, stdout_truncated), (stderr, _), _ = await asyncio.wait_for(
+                    readers,
                     timeout=timeout
                 )
             except asyncio.TimeoutError:
@@ -132,13 +393,9 @@ class TerminalSkill(BaseSkill):
                     error=f"命令执行超时（{timeout}秒）"
                 )
             
-            # 解码输出
-            stdout_str = stdout.decode('utf-8', errors='replace').strip()
-            stderr_str = stderr.decode('utf-8', errors='replace').strip()
-            
-            # 限制输出长度
-            if len(stdout_str) > 5000:
-                stdout_str = stdout_str[:5000] + "\n...(输出已截断)"
+            # 解码输出（stdout 只解码要保留的末尾部分）
+            stdout_str = _decode_tail(stdout, stdout_truncated)
+            stderr_str = stderr.decode('utf-8', errors='replace').rstrip()
             
             if process.returncode == 0:
                 return SkillResult(
@@ -165,44 +422,21 @@ class TerminalSkill(BaseSkill):
     
     async def _run_safe_command(
         self,
-        command: str,
+        command: _CmdInfo,
         cwd: Optional[str] = None,
         timeout: int = 30
     ) -> SkillResult:
         """执行安全命令（只读类）"""
-        if not self._is_command_readonly(command):
+        if not self._is_readonly(command):
             return SkillResult(
                 success=False,
                 output=None,
-                error=f"命令不在安全列表中: {command}"
+                error=f"命令不在安全列表中: {command.raw}"
             )
         
-        # 安全命令直接执行
-        return await self._run_command(command, cwd, timeout)
+        # 安全命令直接执行，简单命令不再额外启动 shell
+        return await self._run_checked(command, cwd, timeout, self._exec_argv(command.raw))
     
     def get_schema(self) -> Dict[str, Any]:
         """获取 Function Calling Schema"""
-        return create_tool_schema(
-            name="terminal",
-            description="执行终端命令。危险命令会被拒绝，需要用户确认才能执行",
-            parameters={
-                "action": {
-                    "type": "string",
-                    "enum": ["run_command", "run_safe_command"],
-                    "description": "操作类型：run_command 需要确认，run_safe_command 仅执行只读命令"
-                },
-                "command": {
-                    "type": "string",
-                    "description": "要执行的命令"
-                },
-                "cwd": {
-                    "type": "string",
-                    "description": "工作目录（可选）"
-                },
-                "timeout": {
-                    "type": "integer",
-                    "description": "超时时间（秒）"
-                }
-            },
-            required=["action", "command"]
-        )
+        return _TERMINAL_SCHEMA
@@ -6,9 +6,14 @@ Author: gngdingghuan
 """
 
 import re
-from typing import Dict, Any, Optional, List
+import copy
+import asyncio
+import html as html_module
+import importlib.util
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
 
 import httpx
+from cachetools import TTLCache
 
 from skills.base_skill import BaseSkill, SkillResult, PermissionLevel, create_tool_schema
 from utils.logger import log
@@ -21,28 +26,129 @@ try:
 except ImportError:
     DDGS_AVAILABLE = False
 
+# 原生异步搜索接口（duckduckgo-search 7.0 起已移除，届时在线程中调用同步接口）
+try:
+    from duckduckgo_search import AsyncDDGS
+    ASYNC_DDGS_AVAILABLE = True
+except ImportError:
+    ASYNC_DDGS_AVAILABLE = False
 
-class WebBrowserSkill(BaseSkill):
-    """网页浏览技能"""
-    
-    name = "web_browser"
-    description = "网页浏览：搜索信息、读取网页内容、打开URL"
-    permission_level = PermissionLevel.READ_ONLY
+# HTML 解析器：优先 selectolax，其次 lxml，都不可用时退化为正则
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    try:
+        # selectolax 1.0 之前的版本
+        from selectolax.parser import HTMLParser
+        SELECTOLAX_AVAILABLE = True
+    except ImportError:
+        SELECTOLAX_AVAILABLE = False
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# HTTP/2 需要安装 h2（httpx[http2]）
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 所有网页请求共享的 HTTP 客户端（跨技能实例复用连接和 TLS 会话）
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def get_web_client() -> httpx.AsyncClient:
+    """获取共享的网页请求客户端"""
+    global _shared_client
     
-    def __init__(self):
-        super().__init__()
-        self._client = httpx.AsyncClient(
-            timeout=30.0,
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=100),
+            timeout=httpx.Timeout(30.0, connect=5.0),
             follow_redirects=True,
             headers={
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
             }
         )
     
+    return _shared_client
+
+
+async def close_web_client():
+    """关闭共享客户端（程序退出时调用一次）"""
+    global _shared_client
+    
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
+
+# 网页最多下载的字节数（正文只取前 5000 字，更大的页面没有必要完整下载）
+MAX_PAGE_BYTES = 512 * 1024
+
+# 搜索和网页读取结果缓存：成功结果保留 5 分钟，失败结果保留 30 秒（避免反复重试同一失败请求）
+_result_cache: TTLCache = TTLCache(maxsize=256, ttl=300)
+_error_cache: TTLCache = TTLCache(maxsize=256, ttl=30)
+
+# search_and_read 同时读取的网页数上限
+MAX_CONCURRENT_FETCHES = 4
+
+# HTML 清理用的正则（模块加载时编译一次）
+_RE_SCRIPT = re.compile(r'<script[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE)
+_RE_STYLE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL | re.IGNORECASE)
+_RE_TAG = re.compile(r'<[^>]+>')
+
+
+# Function Calling Schema（静态内容，模块加载时构建一次）
+_WEB_SCHEMA = create_tool_schema(
+    name="web_browser",
+    description="网页浏览操作：搜索信息、搜索并读取结果页面、读取网页内容、打开URL、查询天气",
+    parameters={
+        "action": {
+            "type": "string",
+            "enum": ["search", "search_and_read", "read_webpage", "open_url", "get_weather"],
+            "description": "要执行的操作类型"
+        },
+        "query": {
+            "type": "string",
+            "description": "搜索关键词（用于 search, search_and_read）"
+        },
+        "url": {
+            "type": "string",
+            "description": "网页 URL（用于 read_webpage, open_url）"
+        },
+        "city": {
+            "type": "string",
+            "description": "城市名称（用于 get_weather）"
+        },
+        "max_results": {
+            "type": "integer",
+            "description": "最大结果数量（用于 search, search_and_read）"
+        },
+        "fetch_top": {
+            "type": "integer",
+            "description": "读取前几条结果的网页内容（用于 search_and_read，默认 3）"
+        }
+    },
+    required=["action"]
+)
+
+
+class WebBrowserSkill(BaseSkill):
+    """网页浏览技能"""
+    
+    name = "web_browser"
+    description = "网页浏览：搜索信息、读取网页内容、打开URL"
+    permission_level = PermissionLevel.READ_ONLY
+    
     async def execute(self, action: str, **params) -> SkillResult:
         """执行网页操作"""
         actions = {
             "search": self._search,
+            "search_and_read": self._search_and_fetch,
             "read_webpage": self._read_webpage,
             "open_url": self._open_url,
             "get_weather": self._get_weather,
@@ -58,7 +164,35 @@ class WebBrowserSkill(BaseSkill):
             log.error(f"网页操作失败: {action}, 错误: {e}")
             return SkillResult(success=False, output=None, error=str(e))
     
+    @staticmethod
+    async def _cached(key: Tuple, fetch: Callable[[], Awaitable[SkillResult]]) -> SkillResult:
+        """
+        带 TTL 缓存的请求
+        缓存中保存结果副本，命中时也返回副本，调用方修改结果不会影响缓存
+        """
+        cached = _result_cache.get(key)
+        if cached is None:
+            cached = _error_cache.get(key)
+        
+        if cached is not None:
+            log.debug(f"网页缓存命中: {key}")
+            return copy.deepcopy(cached)
+        
+        result = await fetch()
+        
+        cache = _result_cache if result.success else _error_cache
+        cache[key] = copy.deepcopy(result)
+        
+        return result
+    
     async def _search(self, query: str, max_results: int = 5) -> SkillResult:
+        """搜索信息（结果缓存）"""
+        return await self._cached(
+            ("search", query, max_results),
+            lambda: self._fetch_search(query, max_results),
+        )
+    
+    async def _fetch_search(self, query: str, max_results: int) -> SkillResult:
         """搜索信息"""
         if not DDGS_AVAILABLE:
             return SkillResult(
@@ -70,8 +204,12 @@ class WebBrowserSkill(BaseSkill):
         log.info(f"搜索: {query}")
         
         try:
-            with DDGS() as ddgs:
-                results = list(ddgs.text(query, max_results=max_results))
+            # 搜索是网络请求，不能在事件循环中同步等待
+            if ASYNC_DDGS_AVAILABLE:
+                async with AsyncDDGS() as ddgs:
+                    results = await ddgs.atext(query, max_results=max_results)
+            else:
+                results = await asyncio.to_thread(self._search_sync, query, max_results)
             
             if not results:
                 return SkillResult(
@@ -79,13 +217,14 @@ class WebBrowserSkill(BaseSkill):
                     output={"message": "未找到相关结果", "results": []}
                 )
             
-            formatted_results = []
-            for r in results:
-                formatted_results.append({
+            formatted_results = [
+                {
                     "title": r.get("title", ""),
                     "url": r.get("href", ""),
                     "snippet": r.get("body", "")
-                })
+                }
+                for r in results
+            ]
             
             return SkillResult(
                 success=True,
@@ -99,15 +238,73 @@ class WebBrowserSkill(BaseSkill):
         except Exception as e:
             return SkillResult(success=False, output=None, error=f"搜索失败: {e}")
     
+    @staticmethod
+    def _search_sync(query: str, max_results: int) -> List[Dict[str, Any]]:
+        """同步搜索（在线程中执行）"""
+        with DDGS() as ddgs:
+            return list(ddgs.text(query, max_results=max_results))
+    
+    async def _search_and_fetch(self, query: str, max_results: int = 5, fetch_top: int = 3) -> SkillResult:
+        """搜索并并发读取排名靠前的结果页面（总耗时约等于最慢的一个页面）"""
+        search = await self._search(query, max_results=max_results)
+        if not search.success or not search.output.get("results"):
+            return search
+        
+        top = [r for r in search.output["results"][:fetch_top] if r["url"]]
+        sem = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        
+        async def _fetch(url: str) -> SkillResult:
+            async with sem:
+                return await self._read_webpage(url)
+        
+        pages = await asyncio.gather(*(_fetch(r["url"]) for r in top), return_exceptions=True)
+        
+        results = []
+        for r, page in zip(top, pages):
+            if isinstance(page, BaseException):
+                results.append({**r, "error": str(page)})
+            elif page.success:
+                results.append({**r, "content": page.output["content"]})
+            else:
+                results.append({**r, "error": page.error})
+        
+        return SkillResult(
+            success=True,
+            output={
+                "query": query,
+                "count": len(results),
+                "results": results
+            }
+        )
+    
     async def _read_webpage(self, url: str) -> SkillResult:
+        """读取网页内容（结果缓存）"""
+        return await self._cached(("read", url), lambda: self._fetch_webpage(url))
+    
+    async def _fetch_webpage(self, url: str) -> SkillResult:
         """读取网页内容（提取文本）"""
         log.info(f"读取网页: {url}")
         
         try:
-            response = await self._client.get(url)
-            response.raise_for_status()
+            async with get_web_client().stream("GET", url) as response:
+                response.raise_for_status()
+                
+                # 边下载边计数，超过上限即停止
+                chunks = []
+                total = 0
+                async for chunk in response.aiter_bytes(65536):
+                    chunks.append(chunk)
+                    total += len(chunk)
+                    if total >= MAX_PAGE_BYTES:
+                        break
+                
+                encoding = response.charset_encoding or "utf-8"
             
-            html = response.text
+            try:
+                html = b"".join(chunks).decode(encoding, errors="replace")
+            except LookupError:
+                # 响应头声明了未知的编码
+                html = b"".join(chunks).decode("utf-8", errors="replace")
             
             # 简单的 HTML 清理
             text = self._extract_text(html)
@@ -132,19 +329,64 @@ class WebBrowserSkill(BaseSkill):
     
     def _extract_text(self, html: str) -> str:
         """从 HTML 提取纯文本"""
-        # 移除 script 和 style 标签
-        html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
+        # 空响应或纯文本（JSON、robots.txt 等）无需解析
+        if not html:
+            return ''
+        if '<' not in html:
+            return ' '.join(html.split())
+        
+        if SELECTOLAX_AVAILABLE:
+            text = self._extract_with_selectolax(html)
+        elif LXML_AVAILABLE:
+            text = self._extract_with_lxml(html)
+        else:
+            return self._extract_with_regex(html)
+        
+        if text is None:
+            return self._extract_with_regex(html)
+        
+        # 清理空白字符（解析器已解码 HTML 实体）
+        return ' '.join(text.split())
+    
+    @staticmethod
+    def _extract_with_selectolax(html: str) -> str:
+        """使用 selectolax 提取正文文本"""
+        tree = HTMLParser(html)
+        for node in tree.css('script,style'):
+            node.decompose()
+        return tree.body.text(separator=' ') if tree.body else ''
+    
+    @staticmethod
+    def _extract_with_lxml(html: str) -> Optional[str]:
+        """使用 lxml 提取文本，无法解析时返回 None"""
+        try:
+            doc = lxml.html.fromstring(html)
+        except (ParserError, ValueError):
+            # 空文档，或带 XML 编码声明的字符串
+            return None
+        
+        for node in doc.xpath('//script|//style|//comment()'):
+            node.drop_tree()
+        # text_content() 会把相邻块元素的文字直接拼在一起，逐段拼接时加空格
+        return ' '.join(doc.itertext())
+    
+    @staticmethod
+    def _extract_with_regex(html: str) -> str:
+        """使用正则提取文本（无解析器时的后备方案）"""
+        # 移除 script 和 style 标签（先用一次子串查找确认存在，再做整篇正则替换）
+        html_lower = html.lower()
+        if '<script' in html_lower:
+            html = _RE_SCRIPT.sub('', html)
+        if '<style' in html_lower:
+            html = _RE_STYLE.sub('', html)
         
         # 移除所有 HTML 标签
-        text = re.sub(r'<[^>]+>', ' ', html)
+        text = _RE_TAG.sub(' ', html)
         
-        # 清理空白字符
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
+        # 清理空白字符（str.split 无参数时按任意空白切分并丢弃空串）
+        text = ' '.join(text.split())
         
         # 解码 HTML 实体
-        import html as html_module
         text = html_module.unescape(text)
         
         return text
@@ -164,37 +406,6 @@ class WebBrowserSkill(BaseSkill):
         query = f"{city}天气"
         return await self._search(query, max_results=3)
     
-    async def close(self):
-        """关闭 HTTP 客户端"""
-        await self._client.aclose()
-    
     def get_schema(self) -> Dict[str, Any]:
         """获取 Function Calling Schema"""
-        return create_tool_schema(
-            name="web_browser",
-            description="网页浏览操作：搜索信息、读取网页内容、打开URL、查询天气",
-            parameters={
-                "action": {
-                    "type": "string",
-                    "enum": ["search", "read_webpage", "open_url", "get_weather"],
-                    "description": "要执行的操作类型"
-                },
-                "query": {
-                    "type": "string",
-                    "description": "搜索关键词（用于 search）"
-                },
-                "url": {
-                    "type": "string",
-                    "description": "网页 URL（用于 read_webpage, open_url）"
-                },
-                "city": {
-                    "type": "string",
-                    "description": "城市名称（用于 get_weather）"
-                },
-                "max_results": {
-                    "type": "integer",
-                    "description": "最大结果数量（用于 search）"
-                }
-            },
-            required=["action"]
-        )
+        return _WEB_SCHEMA
@@ -5,6 +5,7 @@ Author: gngdingghuan
 """
 
 import asyncio
+import json
 import pytest
 import sys
 from pathlib import Path
@@ -143,6 +144,15 @@ class TestWebBrowserSkill:
         
         if result.success:
             assert "content" in result.output
+    
+    def test_extract_text(self, skill):
+        """测试 HTML 文本提取"""
+        html = "<html><body><script>var x;</script><p>Hello &amp;\n  world</p></body></html>"
+        assert skill._extract_text(html) == "Hello & world"
+        
+        # 空响应和纯文本直接返回
+        assert skill._extract_text("") == ""
+        assert skill._extract_text('{"a":  1}\n') == '{"a": 1}'
 
 
 class TestTerminalSkill:
@@ -174,6 +184,113 @@ class TestTerminalSkill:
             command="rm -rf /"
         )
         assert not result.success
+    
+    def test_readonly_prefix(self, skill):
+        """测试多词安全命令需要完整前缀匹配"""
+        assert not skill.needs_confirmation({"command": "ls -la"})
+        assert not skill.needs_confirmation({"command": "python --version"})
+        assert skill.needs_confirmation({"command": "python script.py"})
+    
+    @pytest.fixture
+    def spawns(self, skill):
+        """记录子进程启动参数 (command, argv)"""
+        calls = []
+        spawn = skill._spawn
+        
+        async def _recording(command, cwd, argv=None):
+            calls.append((command, argv))
+            return await spawn(command, cwd, argv)
+        
+        skill._spawn = _recording
+        return calls
+    
+    @pytest.mark.skipif(sys.platform == "win32", reason="Windows 下命令始终交给 shell")
+    def test_exec_argv(self, skill):
+        """测试只有不含 shell 元字符的命令才拆分为参数列表"""
+        assert skill._exec_argv("ls -la") == ["ls", "-la"]
+        assert skill._exec_argv("echo 'a  b' c") == ["echo", "a  b", "c"]
+        assert skill._exec_argv("ls | head -1") is None
+        assert skill._exec_argv("echo $HOME") is None
+        assert skill._exec_argv("echo 'unclosed") is None
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_metachar_command_runs_in_shell(self, skill, spawns, tmp_path):
+        """测试含管道的命令经由 shell 执行"""
+        (tmp_path / "a.txt").write_text("a")
+        (tmp_path / "b.txt").write_text("b")
+        
+        result = await skill.execute(action="run_safe_command", command="ls | head -1", cwd=str(tmp_path))
+        
+        assert result.success
+        assert result.output["stdout"] == "a.txt"
+        assert spawns == [("ls | head -1", None)]
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_simple_command_runs_without_shell(self, skill, spawns, tmp_path):
+        """测试简单命令直接 exec，不经 shell"""
+        (tmp_path / "a.txt").write_text("a")
+        
+        result = await skill.execute(action="run_safe_command", command="ls", cwd=str(tmp_path))
+        
+        assert result.success
+        assert result.output["stdout"] == "a.txt"
+        assert spawns == [("ls", ["ls"])]
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_shell_builtin_falls_back_to_shell(self, skill):
+        """测试没有可执行文件的 shell 内建命令（cd）退回 shell 执行"""
+        result = await skill.execute(action="run_safe_command", command="cd /")
+        assert result.success
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_timeout(self, skill):
+        """测试超时的命令被终止"""
+        result = await skill.execute(action="run_command", command="sleep 5", timeout=1)
+        
+        assert not result.success
+        assert "超时" in result.error
+    
+    @pytest.mark.asyncio
+    async def test_invalid_cwd(self, skill, tmp_path):
+        """测试工作目录无效时返回失败"""
+        result = await skill.execute(
+            action="run_safe_command", command="pwd", cwd=str(tmp_path / "missing")
+        )
+        assert not result.success
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_echo_in_process(self, skill, spawns):
+        """测试简单的 echo 在进程内回答，保留引号内的空白"""
+        result = await skill.execute(action="run_safe_command", command="echo 'a  b' c")
+        
+        assert result.success
+        assert result.output["stdout"] == "a  b c"
+        assert spawns == []
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_echo_option_uses_subprocess(self, skill, spawns):
+        """测试带选项的 echo 交给真正的 echo 执行"""
+        result = await skill.execute(action="run_safe_command", command="echo -n x")
+        
+        assert result.success
+        assert result.output["stdout"] == "x"
+        assert len(spawns) == 1
+    
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="依赖 POSIX shell")
+    async def test_pwd_uses_cwd(self, skill, spawns, tmp_path):
+        """测试进程内的 pwd 返回指定的工作目录"""
+        result = await skill.execute(action="run_safe_command", command="pwd", cwd=str(tmp_path))
+        
+        assert result.success
+        assert result.output["stdout"] == str(tmp_path)
+        assert spawns == []
 
 
 class TestMemoryManager:
@@ -227,5 +344,240 @@ class TestContextManager:
         assert context.get_current_task() is None
 
 
+class TestResponseCache:
+    """LLM 响应缓存测试"""
+    
+    @pytest.fixture
+    def cache(self, tmp_path):
+        from cognitive.llm_brain import ResponseCache
+        return ResponseCache(maxsize=10, ttl=60, db_path=str(tmp_path / "llm_cache.db"))
+    
+    @pytest.mark.asyncio
+    async def test_get_set(self, cache):
+        """测试读写与命中统计"""
+        key = cache.make_key(model="m", messages=[{"role": "user", "content": "你好"}])
+        assert await cache.get(key) is None
+        
+        await cache.set(key, {"content": "Hello", "tool_calls": None})
+        assert (await cache.get(key))["content"] == "Hello"
+        
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+    
+    def test_key_is_order_independent(self, cache):
+        """测试缓存键与字段顺序无关"""
+        a = cache.make_key(model="m", temperature=0)
+        b = cache.make_key(temperature=0, model="m")
+        assert a == b
+    
+    @pytest.mark.asyncio
+    async def test_persistence(self, cache, tmp_path):
+        """测试 SQLite 持久化"""
+        from cognitive.llm_brain import ResponseCache
+        key = cache.make_key(model="m")
+        await cache.set(key, {"content": "cached"})
+        
+        reopened = ResponseCache(db_path=str(tmp_path / "llm_cache.db"))
+        assert (await reopened.get(key))["content"] == "cached"
+
+
+class TestTokenBudget:
+    """Token 预算测试"""
+    
+    def test_count_tokens(self):
+        """测试消息 token 统计"""
+        from utils.token_budget import count_tokens
+        
+        short = [{"role": "user", "content": "你好"}]
+        long = short + [{"role": "assistant", "content": "Hello, JARVIS! " * 20}]
+        
+        assert count_tokens(short, "gpt-4o") > 0
+        assert count_tokens(long, "gpt-4o") > count_tokens(short, "gpt-4o")
+    
+    def test_tool_calls_counted(self):
+        """测试工具调用参数计入 token"""
+        from utils.token_budget import count_message_tokens
+        
+        plain = {"role": "assistant", "content": ""}
+        with_tools = {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [{"function": {"name": "terminal", "arguments": '{"command": "ls"}'}}],
+        }
+        assert count_message_tokens(with_tools, "gpt-4o") > count_message_tokens(plain, "gpt-4o")
+    
+    def test_message_tracker_incremental(self):
+        """测试增量跟踪与整体重算结果一致"""
+        from utils.token_budget import MessageTracker, count_tokens
+        
+        messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "你好"}]
+        tracker = MessageTracker("gpt-4o", messages)
+        
+        messages.append({"role": "assistant", "content": "Hello, JARVIS!"})
+        tracker.update(messages)
+        
+        assert tracker.tokens == count_tokens(messages, "gpt-4o")
+        assert tracker.hexdigest == MessageTracker("gpt-4o", messages).hexdigest
+
+
+class _StubMemory:
+    """规划器测试用的记忆桩"""
+    
+    def add_message(self, role, content):
+        pass
+    
+    def get_recent_context(self):
+        return []
+
+
+class _StubContext:
+    """规划器测试用的上下文桩"""
+    
+    def get_context_summary(self):
+        return ""
+
+
+class _StubBrain:
+    """按顺序返回预设响应的 LLM 桩，并记录每次请求的消息"""
+    
+    model = "gpt-4o"
+    
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+    
+    def get_system_prompt(self):
+        return "你是 JARVIS"
+    
+    async def chat(self, messages, tools=None, **kwargs):
+        self.requests.append(list(messages))
+        return self.responses.pop(0)
+
+
+class _CountingSkill:
+    """记录执行次数的技能桩"""
+    
+    description = "测试技能"
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def get_schema(self):
+        return {"type": "function", "function": {"name": "echo", "parameters": {}}}
+    
+    async def execute(self, **params):
+        self.calls += 1
+        return {"echo": params}
+
+
+def _tool_call(call_id, name="echo", arguments=None):
+    """构造 chat() 返回格式的工具调用"""
+    arguments = arguments or {"text": "hi"}
+    return {
+        "id": call_id,
+        "name": name,
+        "arguments": arguments,
+        "raw_arguments": json.dumps(arguments),
+    }
+
+
+class TestReActPlanner:
+    """ReAct 规划器测试"""
+    
+    @pytest.fixture
+    def skill(self):
+        return _CountingSkill()
+    
+    def _planner(self, brain, skill):
+        from cognitive.planner import ReActPlanner
+        return ReActPlanner(brain, _StubMemory(), _StubContext(), {"echo": skill})
+    
+    @pytest.mark.asyncio
+    async def test_identical_calls_execute_once(self, skill):
+        """测试同一响应内相同的幂等调用只执行一次、不触发重复检测，且每个调用都有工具消息"""
+        brain = _StubBrain([
+            {"content": "", "tool_calls": [_tool_call("a"), _tool_call("b")]},
+            {"content": "完成", "tool_calls": []},
+        ])
+        planner = self._planner(brain, skill)
+        
+        assert await planner.plan_and_execute("测试") == "完成"
+        
+        assert skill.calls == 1
+        tool_messages = [m for m in brain.requests[1] if m["role"] == "tool"]
+        assert [m["tool_call_id"] for m in tool_messages] == ["a", "b"]
+        assert tool_messages[0]["content"] == tool_messages[1]["content"]
+    
+    @pytest.mark.asyncio
+    async def test_repeat_across_iterations_breaks(self, skill):
+        """测试跨轮重复调用同一工具时提前结束"""
+        brain = _StubBrain([
+            {"content": "", "tool_calls": [_tool_call("a")]},
+            {"content": "", "tool_calls": [_tool_call("b")]},
+            {"content": "最终答案", "tool_calls": []},
+        ])
+        planner = self._planner(brain, skill)
+        
+        assert await planner.plan_and_execute("测试") == "最终答案"
+        assert skill.calls == 1
+        assert brain.requests[-1][-1]["role"] == "system"
+
+    
+    @pytest.mark.asyncio
+    async def test_repeat_on_last_iteration_still_answers(self, skill):
+        """测试在最后一次循环检测到重复调用时，仍会再请求一次最终答案"""
+        brain = _StubBrain([
+            {"content": "", "tool_calls": [_tool_call("a")]},
+            {"content": "", "tool_calls": [_tool_call("b")]},
+            {"content": "最终答案", "tool_calls": []},
+        ])
+        planner = self._planner(brain, skill)
+        planner.max_iterations = 2
+        
+        assert await planner.plan_and_execute("测试") == "最终答案"
+        assert len(brain.requests) == 3
+
+    
+    @pytest.mark.asyncio
+    async def test_skill_result_unpacked(self):
+        """测试技能返回的 SkillResult 按字段转换为工具结果"""
+        from skills.base_skill import SkillResult
+        
+        class FailingSkill(_CountingSkill):
+            async def execute(self, **params):
+                return SkillResult(success=False, output=None, error="失败")
+        
+        brain = _StubBrain([
+            {"content": "", "tool_calls": [_tool_call("a")]},
+            {"content": "完成", "tool_calls": []},
+        ])
+        planner = self._planner(brain, FailingSkill())
+        
+        await planner.plan_and_execute("测试")
+        
+        tool_message = next(m for m in brain.requests[1] if m["role"] == "tool")
+        assert json.loads(tool_message["content"]) == {"success": False, "output": None, "error": "失败"}
+
+    
+    def test_race_targets_include_current_provider(self, skill):
+        """测试竞速时当前提供商始终参与，未知名称被忽略"""
+        from cognitive.planner import ReActPlanner
+        from config import LLMProvider
+        
+        brain = _StubBrain([])
+        brain.provider = LLMProvider.DEEPSEEK
+        planner = ReActPlanner(
+            brain, _StubMemory(), _StubContext(), {"echo": skill},
+            race_providers=ReActPlanner._parse_providers(["openai", "opnai"]),
+        )
+        
+        assert planner._race_targets() == [LLMProvider.DEEPSEEK, LLMProvider.OPENAI]
+        
+        # 只剩当前提供商时不竞速
+        brain.provider = LLMProvider.OPENAI
+        assert planner._race_targets() is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
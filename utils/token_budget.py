@@ -0,0 +1,141 @@
+"""
+JARVIS Token 预算
+估算消息的 token 数，避免请求超出模型上下文窗口
+
+Author: gngdingghuan
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+from utils.logger import log
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD = 4
+
+# 回复的起始标记开销
+REPLY_OVERHEAD = 3
+
+
+@lru_cache(maxsize=8)
+def get_encoder(model: str):
+    """获取模型对应的编码器（按模型缓存），不可用时返回 None"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # 非 OpenAI 模型（DeepSeek、Ollama 等）或编码文件下载失败，改用通用编码近似
+        pass
+
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        log.warning(f"tiktoken 编码器加载失败，改用估算: {e}")
+        return None
+
+
+def count_text_tokens(text: str, model: str) -> int:
+    """
+    统计文本的 token 数
+
+    Args:
+        text: 文本
+        model: 模型名称
+
+    Returns:
+        token 数（tiktoken 不可用时按 UTF-8 字节数估算）
+    """
+    if not text:
+        return 0
+
+    encoder = get_encoder(model)
+    if encoder is None:
+        # 英文约 4 字节/token，中文约 3 字节/token，取偏保守的估计
+        return len(text.encode("utf-8")) // 3 + 1
+
+    return len(encoder.encode_ordinary(text))
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """提取消息中会计入 token 的文本（内容 + 工具调用）"""
+    text = message.get("content") or ""
+
+    for tc in message.get("tool_calls") or []:
+        function = tc.get("function", {})
+        text += function.get("name", "") + function.get("arguments", "")
+
+    return text
+
+
+def count_message_tokens(message: Dict[str, Any], model: str) -> int:
+    """统计单条消息的 token 数"""
+    return MESSAGE_OVERHEAD + count_text_tokens(message_text(message), model)
+
+
+def count_tokens(messages: List[Dict[str, Any]], model: str) -> int:
+    """
+    统计消息列表的 token 数
+
+    Args:
+        messages: OpenAI 格式的消息列表
+        model: 模型名称
+
+    Returns:
+        token 数
+    """
+    return sum(count_message_tokens(m, model) for m in messages) + REPLY_OVERHEAD
+
+
+class MessageTracker:
+    """
+    增量跟踪消息列表的摘要和 token 数
+    ReAct 循环中消息只在尾部追加，每次只处理新增的消息：
+    摘要为滚动哈希 blake2b(上一摘要 + 新消息)，token 数累加
+    """
+
+    def __init__(self, model: str, messages: Optional[List[Dict[str, Any]]] = None):
+        """
+        初始化跟踪器
+
+        Args:
+            model: 模型名称（用于 token 统计）
+            messages: 初始消息（system + 历史）
+        """
+        self.model = model
+        self.reset(messages or [])
+
+    def reset(self, messages: List[Dict[str, Any]]):
+        """消息被原地修改（裁剪、压缩）后从头重新计算"""
+        self._digest = b""
+        self._seen = 0
+        self.counts: List[int] = []
+        self.tokens = REPLY_OVERHEAD
+        self.update(messages)
+
+    def update(self, messages: List[Dict[str, Any]]):
+        """处理尾部新增的消息"""
+        for message in messages[self._seen:]:
+            data = orjson.dumps(message, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+            self._digest = hashlib.blake2b(self._digest + data, digest_size=32).digest()
+
+            count = count_message_tokens(message, self.model)
+            self.counts.append(count)
+            self.tokens += count
+
+        self._seen = len(messages)
+
+    @property
+    def hexdigest(self) -> str:
+        """当前消息列表的摘要"""
+        return self._digest.hex()